@@ -0,0 +1,149 @@
+"""
+Entrega dos alertas de preço.
+
+As regras ficam em alert_rules e são avaliadas pelo próprio WishlistDatabase
+durante a gravação dos preços; os disparos vão para alert_events, que funciona
+como fila de saída. Aqui eles são formatados e entregues aos sinks
+configurados (arquivo JSON lines e/ou webhook); a interface mostra os não
+dispensados como aviso.
+
+    python -m alerts                       # entrega os pendentes e sai
+    python -m alerts --list                # lista as regras
+    python -m alerts --add target_price --appid 1808500 --threshold 99.90
+    python -m alerts --add all_time_low    # vale para todos os jogos
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from data import ALERT_KINDS, WishlistDatabase
+from http_client import get_http_client
+
+# Arquivo padrão (JSON lines) dos alertas. No ambiente (.env, carregado pelo
+# ponto de entrada): ALERT_FILE troca o arquivo (vazio desliga) e
+# ALERT_WEBHOOK_URL recebe um POST JSON por alerta (opcional)
+DEFAULT_ALERT_FILE = Path(__file__).parent / "alerts.jsonl"
+
+ALERT_LABELS = {
+    "target_price": "Preço-alvo",
+    "below_median": "Abaixo da mediana de 90 dias",
+    "all_time_low": "Menor preço histórico",
+}
+
+
+def format_alert(event):
+    """Texto curto de um alerta (dict de get_alert_events)"""
+    name = event["name"] or f"appid {event['appid']}"
+    shop = f" na {event['shop']}" if event["shop"] else ""
+    currency = event["currency"] or ""
+    text = f"{name}: {currency} {event['price']:.2f}{shop}"
+    if event["kind"] == "target_price":
+        return f"{text} (meta {currency} {event['reference']:.2f})"
+    if event["kind"] == "below_median":
+        return f"{text} ({event['threshold']:g}% abaixo da mediana de 90 dias, limite {currency} {event['reference']:.2f})"
+    return f"{text} (novo menor preço, antes {currency} {event['reference']:.2f})"
+
+
+def describe_rule(rule):
+    """Texto curto de uma regra (dict de get_alert_rules)"""
+    target = rule["name"] or (f"appid {rule['appid']}" if rule["appid"] else "todos os jogos")
+    if rule["kind"] == "target_price":
+        return f"{ALERT_LABELS['target_price']} {rule['threshold']:.2f} — {target}"
+    if rule["kind"] == "below_median":
+        return f"{rule['threshold']:g}% abaixo da mediana de 90 dias — {target}"
+    return f"{ALERT_LABELS['all_time_low']} — {target}"
+
+
+class FileSink:
+    """Acrescenta cada alerta como uma linha JSON em path"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def deliver(self, events):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps({**event, "message": format_alert(event)}, ensure_ascii=False) + "\n")
+
+
+class WebhookSink:
+    """POST JSON de cada alerta em url (ex.: um bot de chat ou um servidor local)"""
+
+    def __init__(self, url, http=None):
+        self.url = url
+        self.http = http or get_http_client()
+
+    def deliver(self, events):
+        for event in events:
+            response = self.http.post(self.url, json={**event, "message": format_alert(event)})
+            response.raise_for_status()
+
+
+def configured_sinks():
+    sinks = []
+    alert_file = os.getenv("ALERT_FILE", str(DEFAULT_ALERT_FILE))
+    if alert_file:
+        sinks.append(FileSink(alert_file))
+    webhook_url = os.getenv("ALERT_WEBHOOK_URL")
+    if webhook_url:
+        sinks.append(WebhookSink(webhook_url))
+    return sinks
+
+
+def deliver_pending(db=None, sinks=None, batch_size=100):
+    """
+    Entrega os alertas pendentes a todos os sinks. Um lote só é marcado como
+    entregue se todos os sinks aceitarem; se algum falhar, fica para a
+    próxima chamada (entrega "pelo menos uma vez"). Retorna quantos alertas
+    foram entregues
+    """
+    db = db or WishlistDatabase()
+    sinks = configured_sinks() if sinks is None else sinks
+    if not sinks:
+        return 0
+
+    delivered = 0
+    while True:
+        events = db.get_alert_events(pending=True, limit=batch_size)
+        if not events:
+            return delivered
+        try:
+            for sink in sinks:
+                sink.deliver(events)
+        except Exception as e:
+            print(f"Erro ao entregar alertas: {e}")
+            return delivered
+        db.mark_alert_events([event["id"] for event in events], delivered=True)
+        delivered += len(events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Alertas de preço da wishlist")
+    parser.add_argument("--list", action="store_true", help="lista as regras")
+    parser.add_argument("--add", choices=ALERT_KINDS, help="cria uma regra")
+    parser.add_argument("--appid", type=int, help="jogo da regra (padrão: todos)")
+    parser.add_argument("--threshold", type=float, help="preço (target_price) ou %% (below_median)")
+    parser.add_argument("--delete", type=int, metavar="ID", help="remove uma regra")
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = WishlistDatabase()
+    if args.add:
+        try:
+            print(f"Regra {db.add_alert_rule(args.add, args.threshold, appid=args.appid)} criada")
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.delete:
+        db.delete_alert_rule(args.delete)
+    elif args.list:
+        for rule in db.get_alert_rules():
+            print(f"{rule['id']}: {describe_rule(rule)}")
+    else:
+        print(f"{deliver_pending(db)} alerta(s) entregue(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Benchmarks do projeto. Execute da raiz: python -m benchmarks.<nome>"""
@@ -0,0 +1,107 @@
+"""
+Compara a leitura do histórico pelo SQLite (JOIN -> tuplas -> pd.DataFrame)
+com o snapshot Parquet (columnar.py, Arrow com memory map e filtros empurrados
+para partições e row groups), além do tempo e tamanho da exportação.
+
+    python -m benchmarks.bench_columnar --games 1000 --points 1000
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import columnar
+from data import DEFAULT_REGION, STEAM_SHOP_ID, WishlistDatabase, get_connection_manager
+
+
+def build_db(path, games, points, seed=0):
+    """points preços por jogo, um a cada ~12 horas até hoje"""
+    rng = random.Random(seed)
+    now = int(time.time())
+    db = WishlistDatabase(path)
+    with db.get_connection() as conn:
+        region_id = db._dictionary_id(conn, "regions", DEFAULT_REGION)
+        currency_id = db._dictionary_id(conn, "currencies", "BRL")
+        conn.executemany("INSERT INTO wishlist_games (appid, name) VALUES (?, ?)",
+                         [(appid, f"Game {appid}") for appid in range(games)])
+        for appid in range(games):
+            ts = now
+            rows = []
+            for _ in range(points):
+                rows.append((appid, STEAM_SHOP_ID, region_id, ts, rng.choice([1999, 2999, 4999, 9990]), currency_id))
+                ts -= rng.randint(6, 18) * 3600
+            conn.executemany("INSERT INTO wishlist_price_points VALUES (?, ?, ?, ?, ?, ?)", rows)
+        db._bump_prices_version(conn)
+        conn.commit()
+    return db
+
+
+def sqlite_wishlist_df(db):
+    """Caminho atual das análises: get_latest_wishlist_with_prices -> DataFrame"""
+    df = pd.DataFrame(db.get_latest_wishlist_with_prices()["items"],
+                      columns=['appid', 'name', 'price', 'currency', 'fetch_date'])
+    df['fetch_date_dt'] = pd.to_datetime(df.pop('fetch_date'), utc=True, format='ISO8601')
+    return df
+
+
+def sqlite_game_df(db, appid):
+    """Caminho SQLite do gráfico (ui.load_game_prices_df)"""
+    df = pd.DataFrame(db.get_prices_for_game(appid)["items"], columns=['price', 'currency', 'ts'])
+    df['fetch_date_dt'] = pd.to_datetime(df.pop('ts'), unit='s', utc=True)
+    return df
+
+
+def timed(fn, reps):
+    start = time.perf_counter()
+    for _ in range(reps):
+        result = fn()
+    return (time.perf_counter() - start) / reps * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--points", type=int, default=1000)
+    parser.add_argument("--reps", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        db = build_db(db_path, args.games, args.points)
+        print(f"{args.games * args.points:,} preços, {args.games} jogos, "
+              f"banco {db._database_size() / 1024 / 1024:.1f} MB")
+
+        game_ids = [random.randrange(args.games) for _ in range(50)]
+        for by in columnar.PARTITIONINGS:
+            path = Path(tmp) / f"parquet-{by}"
+            start = time.perf_counter()
+            columnar.export_snapshot(db, path=path, by=by)
+            export_s = time.perf_counter() - start
+            size_mb = sum(f.stat().st_size for f in path.rglob("*.parquet")) / 1024 / 1024
+            print(f"\nparticionado por {by}: exportação {export_s:.2f}s, {size_mb:.1f} MB")
+
+            sqlite_ms, sqlite_df = timed(lambda: sqlite_wishlist_df(db), args.reps)
+            parquet_ms, parquet_df = timed(lambda: columnar.load_wishlist_prices_df(path=path), args.reps)
+            assert len(sqlite_df) == len(parquet_df)
+            print(f"  histórico completo -> DataFrame: SQLite {sqlite_ms:8.1f} ms, Parquet {parquet_ms:8.1f} ms "
+                  f"({sqlite_ms / parquet_ms:.0f}x)")
+
+            pick = iter(game_ids * 2).__next__
+            sqlite_ms, _ = timed(lambda: sqlite_game_df(db, pick()), len(game_ids))
+            parquet_ms, _ = timed(lambda: columnar.load_game_prices_df(pick(), path=path), len(game_ids))
+            print(f"  um jogo -> DataFrame:            SQLite {sqlite_ms:8.1f} ms, Parquet {parquet_ms:8.1f} ms")
+            assert sqlite_game_df(db, game_ids[0])['price'].tolist() == \
+                columnar.load_game_prices_df(game_ids[0], path=path)['price'].tolist()
+
+            cutoff = pd.Timestamp.now(tz="UTC") - pd.DateOffset(months=3)
+            parquet_ms, window = timed(lambda: columnar.load_wishlist_prices_df(start=cutoff, path=path), args.reps)
+            print(f"  últimos 3 meses, todos os jogos: Parquet {parquet_ms:8.1f} ms ({len(window):,} linhas)")
+
+        get_connection_manager(db_path).close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Compara o caminho antigo (conexões + os 4 DDL originais + commit por
+chamada) com o caminho via ConnectionManager compartilhado (um commit por
+jogo) e com a ingestão em lote (save_wishlist_prices, um único commit).
+O custo de rodar o esquema atual inteiro por chamada aparece à parte
+("per-call + schema").
+
+    python -m benchmarks.bench_connections --games 500
+"""
+import argparse
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from data import DEFAULT_REGION, STEAM_SHOP_ID, WishlistDatabase, get_connection_manager
+
+
+# DDL que o código antigo (init_wishlist_database) rodava a cada chamada
+ORIGINAL_DDL = (
+    '''CREATE TABLE IF NOT EXISTS wishlist_games (
+        appid INTEGER PRIMARY KEY NOT NULL,
+        name TEXT NOT NULL,
+        UNIQUE(name, appid)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS wishlist_prices (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        game_id INTEGER NOT NULL,
+        price REAL,
+        currency TEXT,
+        fetch_date TEXT NOT NULL,
+        FOREIGN KEY (game_id) REFERENCES wishlist_games(appid) ON DELETE CASCADE
+        UNIQUE(game_id, fetch_date)
+    )''',
+    "CREATE INDEX IF NOT EXISTS idx_price_game ON wishlist_prices(game_id)",
+    "CREATE INDEX IF NOT EXISTS idx_price_fetch ON wishlist_prices(fetch_date)",
+)
+
+
+def _insert_price(conn, appid):
+    ts = int(datetime.now(timezone.utc).timestamp())
+    conn.execute('''
+        INSERT INTO wishlist_price_points (game_id, shop_id, region_id, ts, price_cents, currency_id)
+        VALUES (?, ?, (SELECT id FROM regions WHERE code = ?), ?, ?, NULL)
+    ''', (appid, STEAM_SHOP_ID, DEFAULT_REGION, ts, 999))
+
+
+def per_call_connect(db_path, games):
+    """
+    Reproduz o padrão antigo por jogo: uma conexão só para os 4 DDL do
+    init_wishlist_database (commit + close) e outra para insert + commit + close
+    """
+    WishlistDatabase(db_path)  # esquema atual, criado uma vez (fora do padrão antigo)
+    for appid in games:
+        conn = sqlite3.connect(db_path)
+        for statement in ORIGINAL_DDL:
+            conn.execute(statement)
+        conn.commit()
+        conn.close()
+
+        conn = sqlite3.connect(db_path)
+        _insert_price(conn, appid)
+        conn.commit()
+        conn.close()
+
+
+def per_call_full_schema(db_path, games):
+    """Como per_call_connect, mas com o esquema atual inteiro (_create_schema) a cada chamada"""
+    schema = WishlistDatabase(db_path)
+    for appid in games:
+        conn = sqlite3.connect(db_path)
+        schema._create_schema(conn)
+        _insert_price(conn, appid)
+        conn.commit()
+        conn.close()
+
+
+def pooled(db_path, games):
+    data_instance = WishlistDatabase(db_path)
+    for appid in games:
+        data_instance.save_wishlist_game_price({"price": 9.99, "currency": "BRL"}, appid)
+
+
+def batched(db_path, games):
+    data_instance = WishlistDatabase(db_path)
+    data_instance.save_wishlist_prices((appid, 9.99, "BRL", None) for appid in games)
+
+
+def run(fn, games):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        start = time.perf_counter()
+        fn(db_path, games)
+        elapsed = time.perf_counter() - start
+        get_connection_manager(db_path).close()
+        return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, default=500)
+    args = parser.parse_args()
+
+    games = list(range(1, args.games + 1))
+    for name, fn in [
+        ("per-call connect", per_call_connect),
+        ("per-call + schema", per_call_full_schema),
+        ("pooled", pooled),
+        ("batched", batched),
+    ]:
+        elapsed = run(fn, games)
+        print(f"{name:>18}: {elapsed:.3f}s ({len(games) / elapsed:,.0f} writes/s)")
+
+
+if __name__ == "__main__":
+    main()
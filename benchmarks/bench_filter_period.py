@@ -0,0 +1,77 @@
+"""
+Compara a implementação anterior de filter_by_period (máscaras + concat +
+sort) com a atual (searchsorted) e com filter_by_period_grouped, em um
+histórico sintético.
+
+    python -m benchmarks.bench_filter_period --games 1000 --points 2000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import PERIOD_MONTHS, filter_by_period, filter_by_period_grouped
+
+
+def legacy_filter_by_period(df, period, date_column):
+    """Implementação anterior, mantida apenas como referência"""
+    max_date = df[date_column].max()
+    start_date = max_date - pd.DateOffset(months=PERIOD_MONTHS.get(period, 18))
+
+    df_period = df[df[date_column] >= start_date]
+    df_ancora = df[df[date_column] < start_date].sort_values(date_column).tail(1)
+    if not df_ancora.empty:
+        df_ancora = df_ancora.assign(**{date_column: start_date})
+
+    return pd.concat([df_ancora, df_period]).sort_values(date_column)
+
+
+def synthetic_history(games, points, seed=0):
+    """points preços por jogo, a cada ~6 horas, ordenados por (appid, data)"""
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp("2026-01-01", tz="UTC")
+    hours = rng.integers(1, 12, size=(games, points)).cumsum(axis=1)[:, ::-1]
+    dates = end - pd.to_timedelta(hours.ravel(), unit="h")
+    return pd.DataFrame({
+        "appid": np.repeat(np.arange(games), points),
+        "price": rng.choice([19.99, 29.99, 49.99], size=games * points),
+        "fetch_date_dt": dates,
+    })
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--period", default="Último ano", choices=list(PERIOD_MONTHS))
+    args = parser.parse_args()
+
+    df = synthetic_history(args.games, args.points)
+    print(f"{len(df):,} linhas, {args.games} jogos")
+
+    # Um jogo (caso do gráfico)
+    game = df[df["appid"] == 0].reset_index(drop=True)
+    reps = 200
+    legacy, _ = timed(lambda: [legacy_filter_by_period(game, args.period, "fetch_date_dt") for _ in range(reps)])
+    current, _ = timed(lambda: [filter_by_period(game, args.period, "fetch_date_dt") for _ in range(reps)])
+    print(f"1 jogo    legacy: {legacy / reps * 1000:.2f} ms   searchsorted: {current / reps * 1000:.2f} ms")
+
+    # Todos os jogos
+    legacy, expected = timed(lambda: pd.concat(
+        legacy_filter_by_period(group, args.period, "fetch_date_dt") for _, group in df.groupby("appid")
+    ))
+    current, result = timed(lambda: filter_by_period_grouped(df, args.period, "fetch_date_dt", "appid"))
+    print(f"todos     legacy (loop): {legacy:.2f} s   grouped: {current:.2f} s")
+
+    assert expected.reset_index(drop=True).equals(result.reset_index(drop=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Mede fetch_all_wishlist_history contra o servidor falso local, com
+latência e respostas 429 configuráveis.
+
+    python -m benchmarks.bench_itad_history --games 100 --latency 0.2 --rps 10 --workers 8
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import itad_integration
+from benchmarks.fake_server import FakeServer
+from data import WishlistDatabase, get_connection_manager
+from http_client import HttpClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--rps", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="429 a cada N requisições")
+    args = parser.parse_args()
+
+    items = [(appid, f"Game {appid}") for appid in range(1, args.games + 1)]
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeServer(latency=args.latency, rate_limit_every=args.rate_limit_every) as server:
+        db_path = Path(tmp) / "bench.db"
+        for workers in (1, args.workers):
+            db_path.unlink(missing_ok=True)
+            get_connection_manager(db_path).close()
+            itad_integration._game_id_cache = itad_integration.LRUCache()
+
+            client = itad_integration.ITADClient(
+                "key", db=WishlistDatabase(db_path), base_url=server.url,
+                requests_per_second=args.rps, http=HttpClient(max_per_host=workers)
+            )
+            start = time.perf_counter()
+            result = client.fetch_all_wishlist_history(items, max_workers=workers)
+            elapsed = time.perf_counter() - start
+            print(f"workers={workers:>2}: {elapsed:.2f}s ({args.games / elapsed:,.1f} jogos/s) — {result['message']}")
+
+        get_connection_manager(db_path).close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compara o pico de memória (tracemalloc) e o tempo de gravação de um
+histórico ITAD grande: lista inteira (json.load + sort + gravação) contra o
+pipeline em fluxo (iter_json_array -> dedupe -> executemany em lotes).
+
+    python -m benchmarks.bench_itad_stream --entries 200000
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from data import WishlistDatabase, dedupe_consecutive_prices, get_connection_manager
+from itad_integration import ITADClient
+
+
+def write_history(path, entries, seed=0):
+    """Histórico sintético no formato de /games/history/v2, do mais recente para o mais antigo"""
+    rng = random.Random(seed)
+    start = datetime(2015, 1, 1, tzinfo=timezone.utc)
+    price = 99.90
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i in range(entries):
+            # Preço muda em ~1/3 dos pontos, o resto repete o anterior
+            if rng.random() < 0.33:
+                price = round(rng.uniform(5, 250), 2)
+            entry = {
+                "timestamp": (start + timedelta(hours=entries - i)).isoformat(),
+                "shop": {"id": 61, "name": "Steam"},
+                "deal": {
+                    "price": {"amount": price, "amountInt": int(price * 100), "currency": "BRL"},
+                    "regular": {"amount": 249.90, "amountInt": 24990, "currency": "BRL"},
+                    "cut": 0,
+                },
+            }
+            f.write(("," if i else "") + json.dumps(entry))
+        f.write("]")
+
+
+def run_list(client, db, appid, path):
+    with open(path, "rb") as f:
+        price_history = client._parse_history_response(json.load(f))
+    return db.save_price_history_to_db(appid, price_history)
+
+
+def run_stream(client, db, appid, path):
+    with open(path, "rb") as f:
+        entries = dedupe_consecutive_prices(client.iter_price_history(f), keep="last")
+        return db.save_price_history_stream(appid, entries, chunk_size=client.HISTORY_CHUNK_SIZE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history_path = Path(tmp) / "history.json"
+        write_history(history_path, args.entries)
+        size_mb = history_path.stat().st_size / 1024 / 1024
+        print(f"{args.entries:,} entradas ({size_mb:.1f} MB)")
+
+        for label, run in (("lista", run_list), ("fluxo", run_stream)):
+            db_path = Path(tmp) / f"{label}.db"
+            db = WishlistDatabase(db_path)
+            client = ITADClient("key", db=db)
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            saved = run(client, db, 1, history_path)
+            elapsed = time.perf_counter() - start
+            peak_kb = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.stop()
+
+            print(f"{label}: {elapsed:.2f}s, pico de memória {peak_kb:,} KB, {saved:,} linhas salvas")
+            get_connection_manager(db_path).close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Compara o layout antigo de preços (wishlist_prices: price REAL, currency
+TEXT, fetch_date TEXT, id AUTOINCREMENT + 2 índices) com o atual
+(wishlist_price_points: centavos, ids de dicionário, epoch, WITHOUT ROWID):
+tamanho do arquivo, tempo da migração e latência das consultas do app.
+
+    python -m benchmarks.bench_price_schema --games 200 --points 2000
+"""
+import argparse
+import itertools
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from data import WishlistDatabase, get_connection_manager
+
+# Layout anterior, mantido apenas como referência
+LEGACY_SCHEMA = '''
+    CREATE TABLE wishlist_games (
+        appid INTEGER PRIMARY KEY NOT NULL,
+        name TEXT NOT NULL,
+        UNIQUE(name, appid)
+    );
+    CREATE TABLE wishlist_prices (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        game_id INTEGER NOT NULL,
+        price REAL,
+        currency TEXT,
+        fetch_date TEXT NOT NULL,
+        FOREIGN KEY (game_id) REFERENCES wishlist_games(appid) ON DELETE CASCADE
+        UNIQUE(game_id, fetch_date)
+    );
+    CREATE INDEX idx_price_game ON wishlist_prices(game_id);
+    CREATE INDEX idx_price_fetch ON wishlist_prices(fetch_date);
+    CREATE TABLE wishlist_latest_price (
+        game_id INTEGER PRIMARY KEY NOT NULL,
+        price REAL,
+        currency TEXT,
+        fetch_date TEXT NOT NULL
+    );
+'''
+
+LEGACY_GAME_WINDOW = '''
+    WITH bounds AS (
+        SELECT strftime('%Y-%m-%dT%H:%M:%S', MAX(fetch_date), ?, '-1 day') AS start
+        FROM wishlist_prices
+        WHERE game_id = ?
+    )
+    SELECT price, currency, fetch_date FROM (
+        SELECT p.price, p.currency, p.fetch_date
+        FROM wishlist_prices p, bounds b
+        WHERE p.game_id = ? AND p.fetch_date >= b.start
+        UNION ALL
+        SELECT * FROM (
+            SELECT p.price, p.currency, p.fetch_date
+            FROM wishlist_prices p, bounds b
+            WHERE p.game_id = ? AND p.fetch_date < b.start
+            ORDER BY p.fetch_date DESC
+            LIMIT 1
+        )
+    )
+    ORDER BY fetch_date
+'''
+
+LEGACY_SUMMARY = '''
+    WITH ordered AS (
+        SELECT
+            game_id, price, fetch_date,
+            LAG(price) OVER (PARTITION BY game_id ORDER BY fetch_date) AS prev_price
+        FROM wishlist_prices
+        WHERE price IS NOT NULL
+    ),
+    stats AS (
+        SELECT
+            game_id,
+            MIN(price) AS all_time_low,
+            MAX(price) AS all_time_high,
+            MIN(CASE WHEN fetch_date >= ? THEN price END) AS window_low,
+            MAX(CASE WHEN prev_price IS NULL OR price <> prev_price THEN fetch_date END) AS last_change
+        FROM ordered
+        GROUP BY game_id
+    )
+    SELECT
+        g.appid, g.name, l.price, l.currency, s.all_time_low,
+        MIN(l.price, COALESCE(s.window_low, l.price)),
+        CASE WHEN s.all_time_high > 0
+            THEN ROUND(100.0 * (s.all_time_high - l.price) / s.all_time_high, 1)
+        END,
+        s.last_change
+    FROM wishlist_games g
+    INNER JOIN wishlist_latest_price l ON l.game_id = g.appid
+    INNER JOIN stats s ON s.game_id = g.appid
+    ORDER BY g.name
+'''
+
+
+def build_legacy(path, games, points, seed=0):
+    """points mudanças de preço por jogo, a cada ~6 horas até hoje"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany("INSERT INTO wishlist_games VALUES (?, ?)", [(appid, f"Game {appid}") for appid in range(games)])
+    for appid in range(games):
+        dates = [now]
+        for _ in range(points - 1):
+            dates.append(dates[-1] - timedelta(hours=rng.randint(1, 12)))
+        conn.executemany(
+            "INSERT INTO wishlist_prices (game_id, price, currency, fetch_date) VALUES (?, ?, 'BRL', ?)",
+            [(appid, rng.choice([19.99, 29.99, 49.99, 99.9]), date.isoformat()) for date in dates]
+        )
+    conn.execute('''
+        INSERT INTO wishlist_latest_price
+        SELECT game_id, price, currency, fetch_date FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY game_id ORDER BY fetch_date DESC) AS rn
+            FROM wishlist_prices
+        ) WHERE rn = 1
+    ''')
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def legacy_chart_df(conn, appid):
+    """Caminho anterior do gráfico: janela de 6 meses + conversão de texto ISO"""
+    df = pd.DataFrame(conn.execute(LEGACY_GAME_WINDOW, ("-6 months", appid, appid, appid)).fetchall(),
+                      columns=['price', 'currency', 'fetch_date'])
+    df['fetch_date_dt'] = pd.to_datetime(df['fetch_date'], utc=True, format='ISO8601')
+    return df
+
+
+def chart_df(db, appid):
+    """Caminho atual (ui.load_game_prices_df): epoch inteiro"""
+    df = pd.DataFrame(db.get_prices_for_game(appid, months=6)["items"], columns=['price', 'currency', 'ts'])
+    df['fetch_date_dt'] = pd.to_datetime(df.pop('ts'), unit='s', utc=True)
+    return df
+
+
+def timed(fn, reps):
+    start = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - start) / reps * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--reps", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = Path(tmp) / "legacy.db"
+        current_path = Path(tmp) / "current.db"
+        build_legacy(legacy_path, args.games, args.points)
+        shutil.copy(legacy_path, current_path)
+        print(f"{args.games * args.points:,} preços, {args.games} jogos")
+
+        start = time.perf_counter()
+        db = WishlistDatabase(current_path)
+        migration = time.perf_counter() - start
+        with db.get_connection() as conn:
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        legacy = sqlite3.connect(legacy_path)
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=90)).isoformat(timespec='seconds')
+        game_ids = [random.randrange(args.games) for _ in range(args.reps)]
+        # Cada medição percorre exatamente a mesma sequência de jogos
+        pick = itertools.cycle(game_ids).__next__
+
+        results = {
+            "tamanho (MB)": (
+                legacy_path.stat().st_size / 1024 / 1024,
+                current_path.stat().st_size / 1024 / 1024,
+            ),
+            "histórico 1 jogo (ms)": (
+                timed(lambda: legacy.execute(
+                    "SELECT price, currency, fetch_date FROM wishlist_prices WHERE game_id = ? ORDER BY fetch_date",
+                    (pick(),)).fetchall(), args.reps),
+                timed(lambda: db.get_prices_for_game(pick()), args.reps),
+            ),
+            "janela 6 meses (ms)": (
+                timed(lambda: legacy.execute(LEGACY_GAME_WINDOW, ("-6 months", *[pick()] * 3)).fetchall(), args.reps),
+                timed(lambda: db.get_prices_for_game(pick(), months=6), args.reps),
+            ),
+            "gráfico 6 meses + pandas (ms)": (
+                timed(lambda: legacy_chart_df(legacy, pick()), args.reps),
+                timed(lambda: chart_df(db, pick()), args.reps),
+            ),
+            "resumo todos os jogos (ms)": (
+                timed(lambda: legacy.execute(LEGACY_SUMMARY, (cutoff,)).fetchall(), 3),
+                timed(lambda: db.get_wishlist_price_summary(), 3),
+            ),
+        }
+
+        print(f"migração: {migration:.2f}s")
+        print(f"{'':28} {'antigo':>10} {'atual':>10}")
+        for label, (before, after) in results.items():
+            print(f"{label:28} {before:>10.2f} {after:>10.2f}")
+
+        legacy.close()
+        get_connection_manager(current_path).close()
+
+
+if __name__ == "__main__":
+    main()
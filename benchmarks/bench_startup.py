@@ -0,0 +1,123 @@
+"""
+Custo de inicialização da interface Streamlit:
+
+- import: `python -X importtime` de `import streamlit; import ui` em
+  interpretadores novos (mediana de --runs). O streamlit aparece à parte,
+  porque o `streamlit run` já o carrega; o resto é o que o app adiciona,
+  com os módulos mais caros importados pelo ui
+- reruns: main.py executado com streamlit.testing (AppTest) no mesmo
+  processo: a primeira execução (a frio, inclui os imports do app), os
+  reruns seguintes da aba SteamData, a primeira abertura da aba WishList
+  (pandas/altair) e os reruns dela
+
+Usa o wishlist.db do projeto, como o app.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 5 --reruns 20 --output startup.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+IMPORT_STATEMENT = "import streamlit; import ui"
+
+
+def parse_importtime(stderr):
+    """Linhas do -X importtime: [(profundidade, módulo, us próprios, us acumulados)] na ordem impressa"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def import_times():
+    """Um interpretador novo: tempo (ms) do streamlit, do ui e dos módulos importados diretamente pelo ui"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_STATEMENT],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    entries = parse_importtime(result.stderr)
+
+    top = {name: cumulative / 1000 for depth, name, _, cumulative in entries if depth == 0}
+    # O -X importtime imprime os filhos antes do pai: os de profundidade 1
+    # logo antes da linha do ui são os imports dele
+    children = {}
+    for depth, name, _, cumulative in reversed(entries[:[e[1] for e in entries].index("ui")]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children[name] = cumulative / 1000
+    return {"streamlit_ms": top["streamlit"], "ui_ms": top["ui"], "ui_imports_ms": children}
+
+
+def rerun_times(reruns):
+    """Tempos (ms) de execução do main.py pelo AppTest, por aba"""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(str(ROOT / "main.py"), default_timeout=120)
+
+    def run():
+        start = time.perf_counter()
+        app.run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+        return (time.perf_counter() - start) * 1000
+
+    report = {"cold_ms": round(run(), 2)}
+    report["loaded_after_cold"] = [name for name in ("pandas", "altair", "pyarrow", "requests") if name in sys.modules]
+    report["steamdata_rerun_ms"] = summarize([run() for _ in range(reruns)])
+
+    app.session_state["main_tab"] = "WishList"
+    report["wishlist_first_ms"] = round(run(), 2)
+    report["wishlist_rerun_ms"] = summarize([run() for _ in range(reruns)])
+    return report
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        "p50": round(statistics.median(values), 2),
+        "p90": round(values[min(len(values) - 1, int(len(values) * 0.9))], 2),
+        "max": round(values[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="interpretadores novos para o -X importtime")
+    parser.add_argument("--reruns", type=int, default=10, help="reruns medidos por aba")
+    parser.add_argument("--output", help="arquivo JSON (padrão: stdout)")
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.runs)]
+    report = {
+        "python": sys.version.split()[0],
+        "import": {
+            "streamlit_ms": round(statistics.median(run["streamlit_ms"] for run in runs), 1),
+            "ui_ms": round(statistics.median(run["ui_ms"] for run in runs), 1),
+            "ui_imports_ms": {
+                name: round(statistics.median(run["ui_imports_ms"].get(name, 0) for run in runs), 1)
+                for name in sorted(runs[0]["ui_imports_ms"], key=runs[0]["ui_imports_ms"].get, reverse=True)[:10]
+            },
+        },
+        "app": rerun_times(args.reruns),
+    }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
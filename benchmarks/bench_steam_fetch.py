@@ -0,0 +1,53 @@
+"""
+Compara a busca serial de getAppDetails com getAppDetailsConcurrent e a
+busca de preços em lote (getAppPricesBatched) contra o servidor falso local.
+
+    python -m benchmarks.bench_steam_fetch --games 200 --latency 0.05 --workers 8
+"""
+import argparse
+import time
+
+from benchmarks.fake_server import FakeServer
+from http_client import HttpClient
+from steam import steamclient
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rps", type=float, default=None, help="limite de requisições/s")
+    args = parser.parse_args()
+
+    appids = list(range(1, args.games + 1))
+
+    with FakeServer(latency=args.latency) as server:
+        # Sem cache de respostas, para medir sempre a rede
+        http = HttpClient(max_per_host=args.workers)
+        client = steamclient("steamid", "key", base_url=server.url, store_url=server.url, http=http)
+
+        start = time.perf_counter()
+        serial = [client.getAppDetails(appid) for appid in appids]
+        serial_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        concurrent = list(client.getAppDetailsConcurrent(
+            appids, max_workers=args.workers, requests_per_second=args.rps
+        ))
+        concurrent_elapsed = time.perf_counter() - start
+
+        requests_before = server.requests["/api/appdetails"]
+        start = time.perf_counter()
+        batched = list(client.getAppPricesBatched(appids))
+        batched_elapsed = time.perf_counter() - start
+        batched_requests = server.requests["/api/appdetails"] - requests_before
+
+    assert len(serial) == len(concurrent) == len(batched) == len(appids)
+    print(f"    serial: {serial_elapsed:.2f}s ({len(appids) / serial_elapsed:,.1f} apps/s)")
+    print(f"concurrent: {concurrent_elapsed:.2f}s ({len(appids) / concurrent_elapsed:,.1f} apps/s)")
+    print(f"   batched: {batched_elapsed:.2f}s ({batched_requests} requisições, só preços)")
+
+
+if __name__ == "__main__":
+    main()
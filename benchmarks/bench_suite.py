@@ -0,0 +1,179 @@
+"""
+Roda a sincronização completa (wishlist, preços, histórico ITAD e uma
+segunda passada incremental do histórico) contra o servidor falso local,
+para wishlists de vários tamanhos, e emite as métricas em JSON:
+vazão, percentis de latência por endpoint, requisições/erros e tamanho do banco.
+
+    python -m benchmarks.bench_suite --sizes 100,1000,10000 --output bench.json
+    python -m benchmarks.bench_suite --sizes 100 --latency 0.05 --error-rate 0.01 --rate-limit-every 50
+"""
+import argparse
+import contextlib
+import json
+import platform
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlparse
+
+import itad_integration
+import sync
+from benchmarks.fake_server import FakeServer
+from data import WishlistDatabase, get_connection_manager
+from http_client import HttpClient
+from steam import steamclient
+
+
+def percentile(values, q):
+    """Percentil por posição (nearest-rank) de uma lista já ordenada"""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+class LatencyRecorder:
+    """Hook de resposta da requests.Session: guarda latência e status por endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def __call__(self, response, *args, **kwargs):
+        path = urlparse(response.url).path
+        with self._lock:
+            self.samples[path].append(response.elapsed.total_seconds())
+            self.statuses[path][response.status_code] += 1
+
+    def drain(self):
+        """Métricas acumuladas desde a última chamada, por endpoint"""
+        with self._lock:
+            samples, statuses = self.samples, self.statuses
+            self.samples = defaultdict(list)
+            self.statuses = defaultdict(lambda: defaultdict(int))
+
+        metrics = {}
+        for path, values in samples.items():
+            values.sort()
+            metrics[path] = {
+                "requests": len(values),
+                "status": {str(code): count for code, count in sorted(statuses[path].items())},
+                "latency_ms": {
+                    name: round(percentile(values, q) * 1000, 2)
+                    for name, q in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))
+                },
+            }
+        return metrics
+
+
+def run_stage(name, fn, items, recorder, db):
+    start = time.perf_counter()
+    message = fn()
+    elapsed = time.perf_counter() - start
+    return {
+        "stage": name,
+        "items": items,
+        "elapsed_s": round(elapsed, 3),
+        "items_per_s": round(items / elapsed, 1) if elapsed else None,
+        "message": message,
+        "db_bytes": db._database_size(),
+        "endpoints": recorder.drain(),
+    }
+
+
+def run_size(size, args):
+    """Uma wishlist de `size` jogos, do zero, em um banco temporário"""
+    itad_integration._game_id_cache = itad_integration.LRUCache()
+    recorder = LatencyRecorder()
+    http = HttpClient(max_per_host=args.workers, max_retries=args.max_retries)
+    http.session.hooks["response"].append(recorder)
+
+    def progress(current, total, message=None):
+        pass
+
+    with tempfile.TemporaryDirectory() as tmp, FakeServer(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_every=args.rate_limit_every,
+        retry_after=args.retry_after,
+        wishlist_size=size,
+        seed=args.seed,
+    ) as server:
+        db_path = Path(tmp) / "bench.db"
+        db = WishlistDatabase(db_path)
+        steam = steamclient("steamid", "key", base_url=server.url, store_url=server.url, http=http)
+        itad = itad_integration.ITADClient(
+            "key", db=db, base_url=server.url, requests_per_second=args.rps, http=http
+        )
+
+        def history():
+            items = [(row[0], row[1]) for row in db.get_latest_wishlist()["items"]]
+            result = itad.fetch_all_wishlist_history(items, max_workers=args.workers)
+            if not result["success"]:
+                raise RuntimeError(result["message"])
+            return result["message"]
+
+        stages = [
+            run_stage("wishlist", lambda: sync.sync_wishlist(db, progress, steam=steam), size, recorder, db),
+            run_stage("prices", lambda: sync.sync_prices(db, progress, steam=steam), size, recorder, db),
+            run_stage("history", history, size, recorder, db),
+            run_stage("history_incremental", history, size, recorder, db),
+        ]
+
+        with db.get_connection() as conn:
+            rows = conn.execute("SELECT COUNT(*) FROM wishlist_price_points").fetchone()[0]
+        get_connection_manager(db_path).close()
+
+    return {
+        "games": size,
+        "elapsed_s": round(sum(stage["elapsed_s"] for stage in stages), 3),
+        "price_rows": rows,
+        "db_bytes": stages[-1]["db_bytes"],
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000", help="tamanhos de wishlist, separados por vírgula")
+    parser.add_argument("--latency", type=float, default=0.02, help="atraso (s) por requisição")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 500")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="429 a cada N requisições")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After (s) dos 429")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rps", type=float, default=200, help="limite de requisições/s da ITAD")
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="arquivo JSON (padrão: stdout)")
+    args = parser.parse_args()
+
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "config": {name: value for name, value in vars(args).items() if name != "output"},
+        "runs": [],
+    }
+    for size in (int(size) for size in args.sizes.split(",")):
+        print(f"Rodando wishlist de {size} jogos...", file=sys.stderr)
+        # Os clientes registram erros com print: fora do JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            report["runs"].append(run_size(size, args))
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
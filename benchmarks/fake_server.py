@@ -0,0 +1,202 @@
+"""
+Servidor HTTP local que imita os endpoints usados pelos clientes, para
+benchmarks sem acessar as APIs reais.
+
+    with FakeServer(latency=0.05) as server:
+        client = steamclient("id", "key", base_url=server.url, store_url=server.url, http=HttpClient())
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FAKE_SHOP_NAMES = {61: "Steam", 35: "GOG", 16: "Epic Game Store"}
+
+
+def fake_itad_id(appid):
+    """Jogos com appid múltiplo de 10 "não existem" na ITAD"""
+    appid = int(appid)
+    return None if appid % 10 == 0 else f"itad-{appid}"
+
+
+def fake_app(appid):
+    """Dados determinísticos de um jogo falso"""
+    appid = int(appid)
+    return {
+        "name": f"Game {appid}",
+        "price_overview": {
+            "currency": "BRL",
+            "initial": 4999 + (appid % 50) * 100,
+            "final": 2999 + (appid % 50) * 100,
+        },
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeServer/1.0"
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch(None)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self._dispatch(json.loads(self.rfile.read(length) or b"null"))
+
+    def _dispatch(self, body):
+        fake = self.server.fake
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if body is not None:
+            params["body"] = body
+        with fake.lock:
+            fake.requests[url.path] += 1
+            request_number = sum(fake.requests.values())
+
+        if fake.latency:
+            time.sleep(fake.latency)
+
+        if fake.error_rate and fake.random.random() < fake.error_rate:
+            return self._send(500, {"error": "fake error"})
+
+        if fake.rate_limit_every and request_number % fake.rate_limit_every == 0:
+            return self._send(429, {"error": "too many requests"}, {"Retry-After": str(fake.retry_after)})
+
+        route = fake.routes.get(url.path)
+        if route is None:
+            return self._send(404, {"error": "not found"})
+        self._send(200, route(params))
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeServer:
+    """
+    - latency: atraso (s) aplicado a cada requisição
+    - error_rate: fração de requisições que respondem 500
+    - rate_limit_every: a cada N requisições, responde 429 com Retry-After
+    - history_days / history_step_days: tamanho e densidade do histórico ITAD
+    - wishlist_size: quantidade de jogos (appids 1..N) devolvida pelo GetWishlist
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0, rate_limit_every=0, retry_after=1,
+                 history_days=400, history_step_days=7, wishlist_size=100):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.history_days = history_days
+        self.history_step_days = history_step_days
+        self.wishlist_size = wishlist_size
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self.routes = {
+            "/api/appdetails": self._appdetails,
+            "/IWishlistService/GetWishlist/v1/": self._wishlist,
+            "/games/lookup/v1": self._itad_lookup,
+            "/lookup/id/shop/61/v1": self._itad_lookup_shop,
+            "/games/history/v2": self._itad_history,
+        }
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _wishlist(self, params):
+        added = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+        return {"response": {"items": [
+            {"appid": appid, "priority": appid, "date_added": added + appid * 3600}
+            for appid in range(1, self.wishlist_size + 1)
+        ]}}
+
+    def _appdetails(self, params):
+        appids = [appid for appid in params.get("appids", "").split(",") if appid]
+
+        # Como a Steam, só aceita vários appids com filters=price_overview
+        if params.get("filters") == "price_overview":
+            return {
+                appid: {"success": True, "data": {"price_overview": fake_app(appid)["price_overview"]}}
+                for appid in appids
+            }
+        if len(appids) > 1:
+            return None
+
+        return {appid: {"success": True, "data": fake_app(appid)} for appid in appids}
+
+    def _itad_lookup(self, params):
+        game_id = fake_itad_id(params["appid"])
+        if game_id is None:
+            return {"found": False}
+        return {"found": True, "game": {"id": game_id}}
+
+    def _itad_lookup_shop(self, params):
+        return {key: fake_itad_id(key.split("/")[1]) for key in params["body"]}
+
+    def _itad_history(self, params):
+        """
+        Uma mudança de preço a cada history_step_days por loja pedida em
+        `shops` (ex.: "61,35"), mais recente primeiro
+        """
+        now = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        since = datetime.fromisoformat(params["since"].replace("Z", "+00:00"))
+        base = 2999 + sum(map(ord, params["id"])) % 50 * 100
+        shops = [int(shop) for shop in params.get("shops", "61").split(",")]
+
+        entries = []
+        for day in range(0, self.history_days, self.history_step_days):
+            timestamp = now - timedelta(days=day)
+            if timestamp < since:
+                break
+            for shop in shops:
+                shop_base = base + (shop - 61) * 10
+                amount = (shop_base if (day // self.history_step_days) % 2 else shop_base // 2) / 100
+                entries.append({
+                    "timestamp": timestamp.isoformat(),
+                    "shop": {"id": shop, "name": FAKE_SHOP_NAMES.get(shop, f"Shop {shop}")},
+                    "deal": {
+                        "price": {"amount": amount, "amountInt": int(amount * 100), "currency": "BRL"},
+                        "regular": {"amount": shop_base / 100, "amountInt": shop_base, "currency": "BRL"},
+                        "cut": 0,
+                    },
+                })
+        return entries
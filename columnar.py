@@ -0,0 +1,340 @@
+"""
+Snapshot colunar (Parquet via Arrow) do histórico de preços, para análises e
+para o gráfico sem passar por tuplas do SQLite e pd.DataFrame linha a linha.
+
+    python -m columnar export             # particionado por mês (padrão)
+    python -m columnar export --by game   # um diretório por jogo
+    python -m columnar info
+
+Layout em PARQUET_DIR:
+
+    games.parquet                     appid int32, name string
+    prices/month=2025-07/part-0.parquet
+        appid int32, shop_id int32, region dictionary<string>,
+        ts timestamp[s, UTC], price_cents int32, currency dictionary<string>
+    snapshot.json                     versão dos preços exportada, linhas, layout
+
+Os arquivos são lidos com memory map e as consultas filtram por partição
+(mês ou jogo) e pelas estatísticas dos row groups, que vêm ordenados por
+(appid, loja, região, ts), a ordem da chave primária do banco.
+"""
+import argparse
+import json
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+import metrics
+from data import DEFAULT_REGION, STEAM_SHOP_ID, WishlistDatabase
+
+PARQUET_DIR = Path(__file__).parent / "parquet"
+SNAPSHOT_FILE = "snapshot.json"
+PARTITIONINGS = ("month", "game")
+# Linhas lidas do SQLite por lote (um RecordBatch) e por row group do Parquet;
+# row groups menores deixam o filtro por jogo descartar mais dados sem ler
+EXPORT_BATCH_SIZE = 65_536
+ROW_GROUP_SIZE = 16_384
+
+GAMES_SCHEMA = pa.schema([
+    ("appid", pa.int32()),
+    ("name", pa.string()),
+])
+
+PRICES_SCHEMA = pa.schema([
+    ("appid", pa.int32()),
+    ("shop_id", pa.int32()),
+    ("region", pa.dictionary(pa.int8(), pa.string())),
+    ("ts", pa.timestamp("s", tz="UTC")),
+    ("price_cents", pa.int32()),
+    ("currency", pa.dictionary(pa.int8(), pa.string())),
+])
+
+# Colunas de partição de cada layout (estilo hive: month=2025-07, appid=123)
+PARTITION_SCHEMAS = {
+    "month": pa.schema([("month", pa.string())]),
+    "game": pa.schema([("appid", pa.int32())]),
+}
+
+# Datasets abertos, por snapshot: descobrir os arquivos custa mais que ler um jogo
+_datasets = {}
+
+
+def _price_batches(conn, by):
+    """RecordBatches de wishlist_price_points na ordem da chave primária"""
+    cursor = conn.execute('''
+        SELECT p.game_id, p.shop_id, r.code, p.ts, p.price_cents, c.code
+        FROM wishlist_price_points p
+        INNER JOIN regions r ON r.id = p.region_id
+        LEFT JOIN currencies c ON c.id = p.currency_id
+        ORDER BY p.game_id, p.shop_id, p.region_id, p.ts
+    ''')
+    while True:
+        rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+        if not rows:
+            return
+        appids, shops, regions, ts, cents, currencies = zip(*rows)
+        columns = [
+            pa.array(appids, pa.int32()),
+            pa.array(shops, pa.int32()),
+            pa.array(regions, pa.string()).dictionary_encode().cast(PRICES_SCHEMA.field("region").type),
+            pa.array(ts, pa.int64()).cast(PRICES_SCHEMA.field("ts").type),
+            pa.array(cents, pa.int32()),
+            pa.array(currencies, pa.string()).dictionary_encode().cast(PRICES_SCHEMA.field("currency").type),
+        ]
+        names = PRICES_SCHEMA.names
+        if by == "month":
+            columns.append(pc.strftime(columns[3], format="%Y-%m"))
+            names = names + ["month"]
+        yield pa.RecordBatch.from_arrays(columns, names=names)
+
+
+@metrics.timed("columnar.export")
+def export_snapshot(db=None, path=PARQUET_DIR, by="month"):
+    """
+    Exporta wishlist_games e wishlist_price_points para Parquet em `path`,
+    particionado por mês ou por jogo (by). Lê o banco em uma única transação
+    de leitura, em lotes, e troca o snapshot anterior só no fim (um snapshot
+    pela metade nunca fica visível).
+
+    Retorna o conteúdo de snapshot.json.
+    """
+    if by not in PARTITIONINGS:
+        raise ValueError(f"by deve ser um de {PARTITIONINGS}")
+
+    db = db or WishlistDatabase()
+    path = Path(path)
+    staging = path.with_name(path.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    schema = PRICES_SCHEMA
+    if by == "month":
+        schema = schema.append(pa.field("month", pa.string()))
+
+    with db.get_connection() as conn:
+        # Versão, jogos e preços do mesmo instante do banco
+        conn.execute("BEGIN")
+        try:
+            prices_version = db.get_prices_version()
+            # Só os jogos ativos; os preços dos removidos continuam no snapshot
+            games = conn.execute(
+                "SELECT appid, name FROM wishlist_games WHERE removed_at IS NULL ORDER BY appid"
+            ).fetchall()
+            pq.write_table(
+                pa.Table.from_pylist([{"appid": appid, "name": name} for appid, name in games], GAMES_SCHEMA),
+                staging / "games.parquet",
+            )
+
+            rows = 0
+            def counted(batches):
+                nonlocal rows
+                for batch in batches:
+                    rows += batch.num_rows
+                    yield batch
+
+            ds.write_dataset(
+                pa.RecordBatchReader.from_batches(schema, counted(_price_batches(conn, by))),
+                staging / "prices",
+                format="parquet",
+                partitioning=ds.partitioning(PARTITION_SCHEMAS[by], flavor="hive"),
+                basename_template="part-{i}.parquet",
+                file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+                min_rows_per_group=ROW_GROUP_SIZE,
+                max_rows_per_group=ROW_GROUP_SIZE,
+                max_partitions=1_000_000,
+                preserve_order=True,
+            )
+        finally:
+            conn.rollback()
+
+    info = {
+        "prices_version": prices_version,
+        "partitioning": by,
+        "games": len(games),
+        "rows": rows,
+        "exported_at": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+    (staging / SNAPSHOT_FILE).write_text(json.dumps(info, indent=2), encoding="utf-8")
+
+    # Troca: o snapshot antigo só é removido quando o novo está completo
+    old = path.with_name(path.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if path.exists():
+        path.rename(old)
+    staging.rename(path)
+    shutil.rmtree(old, ignore_errors=True)
+    return info
+
+
+def snapshot_info(path=PARQUET_DIR):
+    """Conteúdo de snapshot.json, ou None se não houver snapshot"""
+    try:
+        return json.loads((Path(path) / SNAPSHOT_FILE).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def is_current(db=None, path=PARQUET_DIR, by=None):
+    """O snapshot existe (com o particionamento by, se informado) e tem os mesmos preços que o banco?"""
+    info = snapshot_info(path)
+    if info is None or (by is not None and info["partitioning"] != by):
+        return False
+    db = db or WishlistDatabase()
+    return info["prices_version"] == db.get_prices_version()
+
+
+def open_prices(path=PARQUET_DIR):
+    """
+    Dataset Arrow dos preços do snapshot, com os arquivos mapeados em memória.
+    Fica aberto até o snapshot ser reexportado
+    """
+    info = snapshot_info(path)
+    if info is None:
+        raise FileNotFoundError(f"nenhum snapshot em {path} (rode python -m columnar export)")
+
+    path = Path(path).resolve()
+    version = (info["exported_at"], info["prices_version"])
+    cached = _datasets.get(path)
+    if cached is None or cached[0] != version:
+        dataset = ds.dataset(
+            path / "prices",
+            format="parquet",
+            partitioning=ds.partitioning(PARTITION_SCHEMAS[info["partitioning"]], flavor="hive"),
+            filesystem=pafs.LocalFileSystem(use_mmap=True),
+        )
+        cached = _datasets[path] = (version, dataset)
+    return cached[1]
+
+
+def _utc(value):
+    """Data como pd.Timestamp em UTC (datas sem fuso são consideradas UTC)"""
+    value = pd.Timestamp(value)
+    return value.tz_localize("UTC") if value.tzinfo is None else value.tz_convert("UTC")
+
+
+def _price_filter(dataset, appids, start, end, shop_id, region):
+    """Expressão de filtro (empurrada para partições e row groups)"""
+    condition = (ds.field("shop_id") == shop_id) & (ds.field("region") == region)
+    if appids is not None:
+        condition &= ds.field("appid").isin(pa.array(list(appids), pa.int32()))
+    partitioned_by_month = "month" in dataset.partitioning.schema.names
+    if start is not None:
+        start = _utc(start)
+        condition &= ds.field("ts") >= pa.scalar(start, PRICES_SCHEMA.field("ts").type)
+        if partitioned_by_month:
+            # O filtro por ts não descarta diretórios; o por mês sim
+            condition &= ds.field("month") >= start.strftime("%Y-%m")
+    if end is not None:
+        end = _utc(end)
+        condition &= ds.field("ts") < pa.scalar(end, PRICES_SCHEMA.field("ts").type)
+        if partitioned_by_month:
+            condition &= ds.field("month") <= end.strftime("%Y-%m")
+    return condition
+
+
+@metrics.timed("columnar.load_prices")
+def load_prices(appids=None, start=None, end=None, shop_id=STEAM_SHOP_ID, region=DEFAULT_REGION,
+                columns=("appid", "ts", "price_cents", "currency"), path=PARQUET_DIR):
+    """
+    Preços do snapshot como pa.Table, em ordem (appid, ts), lendo só as
+    colunas pedidas e só as partições/row groups que podem ter linhas:
+
+    - appids: iterável de appids (None = todos)
+    - start/end: intervalo [start, end) de datas (naive = UTC)
+    """
+    dataset = open_prices(path)
+    table = dataset.to_table(
+        columns=list(columns),
+        filter=_price_filter(dataset, appids, start, end, shop_id, region),
+    )
+    # Partições/arquivos podem ser lidos fora de ordem
+    return table.sort_by([("appid", "ascending"), ("ts", "ascending")])
+
+
+def load_games(path=PARQUET_DIR):
+    return pq.read_table(Path(path) / "games.parquet", memory_map=True)
+
+
+def prices_to_df(table):
+    """
+    Converte uma tabela de load_prices para o formato do gráfico: [appid,]
+    price (float, reais), currency e fetch_date_dt (datetime UTC)
+    """
+    columns = {}
+    if "appid" in table.column_names:
+        columns['appid'] = table["appid"]
+    columns['price'] = pc.divide(table["price_cents"].cast(pa.float64()), 100)
+    columns['currency'] = table["currency"]
+    columns['fetch_date_dt'] = table["ts"]
+    # Uma única conversão Arrow -> pandas para todas as colunas
+    return pa.table(columns).to_pandas()
+
+
+@metrics.timed("columnar.load_game_prices_df")
+def load_game_prices_df(appid, shop_id=STEAM_SHOP_ID, region=DEFAULT_REGION, path=PARQUET_DIR):
+    """
+    Histórico completo de um jogo (o recorte do período fica com utils.filter_by_period).
+
+    No layout por jogo lê direto o arquivo do jogo (~1 ms); no por mês o
+    filtro precisa abrir um row group de cada mês, o que custa mais que a
+    faixa da chave primária no SQLite (get_prices_for_game)
+    """
+    info = snapshot_info(path)
+    if info is None or info["partitioning"] != "game":
+        table = load_prices([appid], shop_id=shop_id, region=region, path=path)
+        return prices_to_df(table.drop_columns(["appid"]))
+
+    # Arquivos já vêm na ordem da chave primária (loja, região, ts)
+    files = sorted((Path(path) / "prices" / f"appid={int(appid)}").glob("*.parquet"))
+    table = pa.concat_tables([pq.ParquetFile(file, memory_map=True).read() for file in files]) if files \
+        else PRICES_SCHEMA.remove(0).empty_table()
+    return prices_to_df(table.filter((pc.field("shop_id") == shop_id) & (pc.field("region") == region)))
+
+
+@metrics.timed("columnar.load_wishlist_prices_df")
+def load_wishlist_prices_df(appids=None, start=None, end=None, shop_id=STEAM_SHOP_ID,
+                            region=DEFAULT_REGION, path=PARQUET_DIR):
+    """
+    Equivalente colunar de get_latest_wishlist_with_prices -> DataFrame:
+    appid, name (category), price, currency e fetch_date_dt.
+    Sem appids, traz só os jogos ainda na wishlist (games.parquet)
+    """
+    games = load_games(path)
+    if appids is None:
+        appids = games["appid"].to_pylist()
+    df = prices_to_df(load_prices(appids, start, end, shop_id, region, path=path))
+    names = pd.Series(games["name"].to_numpy(zero_copy_only=False), index=games["appid"].to_numpy())
+    df.insert(1, 'name', pd.Categorical(names.reindex(df['appid']).to_numpy()))
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot Parquet do histórico de preços")
+    parser.add_argument("command", choices=("export", "info"))
+    parser.add_argument("--by", choices=PARTITIONINGS, default="month", help="particionamento dos preços")
+    parser.add_argument("--path", type=Path, default=PARQUET_DIR)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        info = export_snapshot(path=args.path, by=args.by)
+        print(f"{info['rows']:,} preços de {info['games']} jogos exportados para {args.path}")
+        return
+
+    info = snapshot_info(args.path)
+    if info is None:
+        print(f"Nenhum snapshot em {args.path}")
+        return
+    state = "atual" if is_current(path=args.path) else "desatualizado"
+    print(json.dumps(info, indent=2))
+    print(f"Snapshot {state}")
+
+
+if __name__ == "__main__":
+    main()
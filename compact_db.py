@@ -0,0 +1,20 @@
+"""
+Compacta o banco: remove de wishlist_price_points os preços repetidos em
+sequência (mantendo só as mudanças) e roda VACUUM.
+
+    python compact_db.py
+"""
+from data import WishlistDatabase
+
+
+def main():
+    result = WishlistDatabase().compact_prices()
+    print(f"Registros removidos: {result['rows_removed']}")
+    print(
+        f"Tamanho: {result['bytes_before'] / 1024:.0f} KB -> {result['bytes_after'] / 1024:.0f} KB "
+        f"({result['bytes_reclaimed'] / 1024:.0f} KB recuperados)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,202 +1,1116 @@
+import json
 import sqlite3
-import pandas as pd
+import threading
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+
+import metrics
 
 WISHLIST_DB_PATH = Path(__file__).parent / "wishlist.db"
 
-#refactor connetions : not oppen in function, create a function to only be 
-# responsible for create a conn, the rest receive the conn as parameter 
-# use "with data_instance.get_connection() as conn" in the ui
+# Loja (id da ITAD) e região usadas por padrão: a Steam Brasil, de onde vêm
+# os preços da wishlist (appdetails com cc=br)
+STEAM_SHOP_ID = 61
+DEFAULT_REGION = "BR"
+
+# Chave em sync_meta incrementada a cada transação que altera
+# wishlist_price_points (persistente, vale entre processos)
+PRICES_VERSION_KEY = "prices_version"
+
+# Regras de alerta de preço (tabela alert_rules, ver _evaluate_alerts):
+# - target_price: preço <= threshold (em reais)
+# - below_median: preço ao menos threshold% abaixo da mediana dos últimos 90 dias
+# - all_time_low: preço abaixo do menor já registrado
+ALERT_KINDS = ("target_price", "below_median", "all_time_low")
+MEDIAN_WINDOW_DAYS = 90
+# A mediana guardada em wishlist_price_stats é recalculada no máximo uma vez por dia
+MEDIAN_MAX_AGE = 24 * 60 * 60
+
+# Um job interrompido (worker parado) volta para a fila até esta quantidade
+# de execuções; depois é marcado como failed (ver recover_stale_sync_jobs)
+SYNC_JOB_MAX_ATTEMPTS = 3
+
+# PRAGMAs aplicados uma única vez quando a conexão é aberta.
+# WAL permite leituras enquanto uma escrita acontece e, junto com
+# synchronous=NORMAL, reduz o custo de fsync por commit.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -16000,      # ~16 MB de page cache
+    "mmap_size": 134217728,    # 128 MB
+    "busy_timeout": 5000,
+}
+
+
+class ConnectionManager:
+    """
+    Mantém uma única conexão SQLite de longa duração por banco de dados.
+
+    - A conexão é aberta na primeira utilização e reaproveitada por todo o processo
+    - Os PRAGMAs de SQLITE_PRAGMAS são aplicados uma única vez
+    - O schema é criado uma única vez (ensure_schema)
+    - O acesso é serializado por um RLock, então a mesma conexão pode ser
+      usada pelas threads de rerun do Streamlit
+    - generation é incrementado a cada transação que altera dados
+      (usado como chave de cache das consultas)
+    """
+
+    def __init__(self, db_path=WISHLIST_DB_PATH, pragmas=None):
+        self.db_path = Path(db_path)
+        self.pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+        self._conn = None
+        self._lock = threading.RLock()
+        self._schema_ready = False
+        self.generation = 0
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Empresta a conexão compartilhada (sem commit automático)"""
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._open()
+            yield self._conn
+
+    @contextmanager
+    def transaction(self):
+        """Empresta a conexão compartilhada e faz commit/rollback ao final"""
+        with self.connection() as conn:
+            changes_before = conn.total_changes
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if conn.total_changes != changes_before:
+                self.generation += 1
+
+    def ensure_schema(self, init_schema):
+        """Executa init_schema(conn) apenas na primeira chamada"""
+        with self._lock:
+            if self._schema_ready:
+                return
+            with self.transaction() as conn:
+                init_schema(conn)
+            self._schema_ready = True
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._schema_ready = False
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_connection_manager(db_path=WISHLIST_DB_PATH):
+    """Retorna o ConnectionManager do processo para db_path (cria se necessário)"""
+    key = Path(db_path).resolve()
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = ConnectionManager(key)
+        return _managers[key]
+
+
+class _CountingIterator:
+    """Conta quantos itens foram consumidos (executemany aceita iteradores)"""
+
+    def __init__(self, iterable):
+        self._it = iter(iterable)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = next(self._it)
+        self.count += 1
+        return item
+
+
+def dedupe_consecutive_prices(entries, keep="first"):
+    """
+    Gera apenas as entradas em que o preço muda em relação à anterior da
+    mesma loja (shop_id; sem a chave, todas contam como uma loja só), sem
+    materializar a lista (entries em ordem de data, crescente ou decrescente).
 
-#refactor, better undestand where to put init function
+    keep: qual entrada de cada sequência de preços iguais é mantida. Com
+    entradas em ordem crescente, "first" mantém a mais antiga; com ordem
+    decrescente (como a ITAD envia), "last" mantém a mais antiga.
+    """
+    last = {}
+    for entry in entries:
+        shop_id = entry.get("shop_id")
+        previous = last.get(shop_id)
+        if previous is not None and entry["price"] == previous["price"]:
+            if keep == "last":
+                last[shop_id] = entry
+            continue
+        if keep == "last":
+            if previous is not None:
+                yield previous
+        else:
+            yield entry
+        last[shop_id] = entry
 
-#refactor, not use for, use execute many
+    if keep == "last":
+        yield from last.values()
+
+
+def _to_cents(price):
+    return None if price is None else int(round(price * 100))
+
+
+def _to_epoch(fetch_date):
+    """Data ISO 8601 ou datetime -> segundos desde 1970 em UTC (sem fuso = UTC)"""
+    if isinstance(fetch_date, str):
+        fetch_date = datetime.fromisoformat(fetch_date)
+    if fetch_date.tzinfo is None:
+        fetch_date = fetch_date.replace(tzinfo=timezone.utc)
+    return int(fetch_date.timestamp())
+
+
+def _table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
 
-#otimizations, build entire query before and us e just one insert
 
 class WishlistDatabase:
 
+    def __init__(self, db_path=WISHLIST_DB_PATH):
+        self.db_path = Path(db_path)
+        self._manager = get_connection_manager(self.db_path)
+        self._manager.ensure_schema(self._create_schema)
+        # Ids já existentes nas tabelas de dicionário: {(tabela, código): id}
+        self._dictionary_ids = {}
+
+    def get_connection(self):
+        """
+        Conexão compartilhada para uso direto:
+
+            with data_instance.get_connection() as conn:
+                conn.execute(...)
+        """
+        return self._manager.connection()
+
+    @metrics.timed("db.get_generation")
+    def get_generation(self):
+        """
+        Identifica a versão atual dos dados: muda a cada gravação feita por
+        este processo (generation) ou por outra conexão (PRAGMA data_version).
+        Serve como chave para cachear resultados de consultas.
+        """
+        with self._manager.connection() as conn:
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            return (self._manager.generation, data_version)
+
     def init_wishlist_database(self):
+        """
+        Cria as tabelas (se não existirem) usando a conexão compartilhada.
+        Normalmente não precisa ser chamada: o construtor já garante o schema.
+        """
+        with self._manager.transaction() as conn:
+            self._create_schema(conn)
+
+    def _create_schema(self, conn):
         """
         MUDANÇA 1: Criar duas tabelas ao invés de uma.
-        
+
         Tabela wishlist_games:
         - Armazena informações básicas do jogo + quando foi adicionado à wishlist
         - Um registro por jogo por fetch
-        
-        Tabela wishlist_prices:
-        - Armazena apenas dados de preço
+
+        Tabela wishlist_price_points:
+        - Armazena apenas dados de preço, por loja e região
         - Relacionada com wishlist_games através de game_id (chave estrangeira)
         - Permite múltiplos registros de preço para o mesmo jogo
         """
-        conn = sqlite3.connect(WISHLIST_DB_PATH)
         cursor = conn.cursor()
-        
-        # Tabela principal de jogos
+
+        # Tabela principal de jogos. priority e date_added (segundos desde
+        # 1970, UTC) vêm do GetWishlist; removed_at marca jogos que saíram da
+        # wishlist (o histórico é mantido e volta se o jogo for readicionado)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS wishlist_games (
                 appid INTEGER PRIMARY KEY NOT NULL,
                 name TEXT NOT NULL,
+                priority INTEGER,
+                date_added INTEGER,
+                removed_at INTEGER,
                 UNIQUE(name, appid)
             )
         ''')
-        
-        # Tabela de preços com relação
+        game_columns = _table_columns(conn, "wishlist_games")
+        for column in ("priority", "date_added", "removed_at"):
+            if column not in game_columns:
+                cursor.execute(f"ALTER TABLE wishlist_games ADD COLUMN {column} INTEGER")
+
+        # Dicionários: lojas (id da ITAD), regiões (país) e moedas são
+        # gravados uma vez e referenciados por id inteiro nos preços
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS wishlist_prices (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+            CREATE TABLE IF NOT EXISTS shops (
+                id INTEGER PRIMARY KEY NOT NULL,
+                name TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS regions (
+                id INTEGER PRIMARY KEY,
+                code TEXT NOT NULL UNIQUE
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS currencies (
+                id INTEGER PRIMARY KEY,
+                code TEXT NOT NULL UNIQUE
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO shops (id, name) VALUES (?, 'Steam')", (STEAM_SHOP_ID,))
+        cursor.execute("INSERT OR IGNORE INTO regions (code) VALUES (?)", (DEFAULT_REGION,))
+
+        # Histórico de preços por jogo, loja e região: preço em centavos,
+        # data em segundos desde 1970 (UTC). A chave primária de uma tabela
+        # WITHOUT ROWID é o próprio índice (game, shop, region, ts) e cobre
+        # todas as colunas, então as consultas não fazem lookup extra.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS wishlist_price_points (
                 game_id INTEGER NOT NULL,
-                price REAL,
-                currency TEXT,
-                fetch_date TEXT NOT NULL,
+                shop_id INTEGER NOT NULL,
+                region_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                price_cents INTEGER,
+                currency_id INTEGER,
+                PRIMARY KEY (game_id, shop_id, region_id, ts),
                 FOREIGN KEY (game_id) REFERENCES wishlist_games(appid) ON DELETE CASCADE
-                UNIQUE(game_id, fetch_date)
+            ) WITHOUT ROWID
+        ''')
+
+        # Preço mais recente de cada jogo/loja/região, mantido por triggers a
+        # cada inserção em wishlist_price_points (preço atual em O(jogos))
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS wishlist_current_prices (
+                game_id INTEGER NOT NULL,
+                shop_id INTEGER NOT NULL,
+                region_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                price_cents INTEGER,
+                currency_id INTEGER,
+                PRIMARY KEY (game_id, shop_id, region_id)
+            ) WITHOUT ROWID
+        ''')
+
+        self._migrate_legacy_prices(conn)
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_current_price_insert
+            AFTER INSERT ON wishlist_price_points
+            BEGIN
+                INSERT INTO wishlist_current_prices
+                    (game_id, shop_id, region_id, ts, price_cents, currency_id)
+                VALUES (NEW.game_id, NEW.shop_id, NEW.region_id, NEW.ts, NEW.price_cents, NEW.currency_id)
+                ON CONFLICT(game_id, shop_id, region_id) DO UPDATE SET
+                    ts = excluded.ts,
+                    price_cents = excluded.price_cents,
+                    currency_id = excluded.currency_id
+                WHERE excluded.ts >= wishlist_current_prices.ts;
+            END
+        ''')
+
+        # Se o preço mais recente for apagado, recalcula a partir da chave primária
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_current_price_delete
+            AFTER DELETE ON wishlist_price_points
+            WHEN OLD.ts = (
+                SELECT ts FROM wishlist_current_prices
+                WHERE game_id = OLD.game_id AND shop_id = OLD.shop_id AND region_id = OLD.region_id
+            )
+            BEGIN
+                DELETE FROM wishlist_current_prices
+                WHERE game_id = OLD.game_id AND shop_id = OLD.shop_id AND region_id = OLD.region_id;
+                INSERT INTO wishlist_current_prices
+                    (game_id, shop_id, region_id, ts, price_cents, currency_id)
+                SELECT game_id, shop_id, region_id, ts, price_cents, currency_id
+                FROM wishlist_price_points
+                WHERE game_id = OLD.game_id AND shop_id = OLD.shop_id AND region_id = OLD.region_id
+                ORDER BY ts DESC
+                LIMIT 1;
+            END
+        ''')
+
+        # Preenche a tabela uma única vez para bancos migrados
+        cursor.execute('''
+            INSERT INTO wishlist_current_prices
+                (game_id, shop_id, region_id, ts, price_cents, currency_id)
+            SELECT game_id, shop_id, region_id, ts, price_cents, currency_id
+            FROM (
+                SELECT *,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY game_id, shop_id, region_id ORDER BY ts DESC
+                    ) AS rn
+                FROM wishlist_price_points
             )
+            WHERE rn = 1
+              AND NOT EXISTS (SELECT 1 FROM wishlist_current_prices)
         ''')
-        
+
+        # Estatísticas por jogo/loja/região usadas pelos alertas: menor preço
+        # (mantido por trigger a cada inserção) e mediana de 90 dias
+        # ponderada pelo tempo (recalculada sob demanda, ver _price_median)
         cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_price_game 
-            ON wishlist_prices(game_id)
+            CREATE TABLE IF NOT EXISTS wishlist_price_stats (
+                game_id INTEGER NOT NULL,
+                shop_id INTEGER NOT NULL,
+                region_id INTEGER NOT NULL,
+                low_cents INTEGER NOT NULL,
+                low_ts INTEGER NOT NULL,
+                median_cents INTEGER,
+                median_at INTEGER,
+                PRIMARY KEY (game_id, shop_id, region_id)
+            ) WITHOUT ROWID
         ''')
-        
+
         cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_price_fetch 
-            ON wishlist_prices(fetch_date)
+            CREATE TRIGGER IF NOT EXISTS trg_price_stats_insert
+            AFTER INSERT ON wishlist_price_points
+            WHEN NEW.price_cents IS NOT NULL
+            BEGIN
+                INSERT INTO wishlist_price_stats (game_id, shop_id, region_id, low_cents, low_ts)
+                VALUES (NEW.game_id, NEW.shop_id, NEW.region_id, NEW.price_cents, NEW.ts)
+                ON CONFLICT(game_id, shop_id, region_id) DO UPDATE SET
+                    low_cents = excluded.low_cents,
+                    low_ts = excluded.low_ts
+                WHERE excluded.low_cents < wishlist_price_stats.low_cents;
+            END
         ''')
-        
-        conn.commit()
-        conn.close()
 
-    def save_wishlist_game(self, wishlist_game:dict):
+        # Um ponto antigo (ex.: backfill da ITAD) dentro da janela da mediana
+        # invalida a mediana guardada, que foi calculada sem ele
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_price_stats_median_backfill
+            AFTER INSERT ON wishlist_price_points
+            WHEN NEW.ts >= CAST(strftime('%s', 'now') AS INTEGER) - {MEDIAN_WINDOW_DAYS * 24 * 60 * 60}
+            BEGIN
+                UPDATE wishlist_price_stats SET median_at = NULL
+                WHERE game_id = NEW.game_id AND shop_id = NEW.shop_id AND region_id = NEW.region_id
+                  AND median_at > NEW.ts;
+            END
+        ''')
+
+        # Preenche uma única vez para bancos que já tinham preços
+        # (MIN com coluna "solta": ts vem da linha do menor preço)
+        cursor.execute('''
+            INSERT INTO wishlist_price_stats (game_id, shop_id, region_id, low_cents, low_ts)
+            SELECT game_id, shop_id, region_id, MIN(price_cents), ts
+            FROM wishlist_price_points
+            WHERE price_cents IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM wishlist_price_stats)
+            GROUP BY game_id, shop_id, region_id
+        ''')
+
+        # Regras de alerta (kind em ALERT_KINDS). game_id/shop_id/region_id
+        # NULL = vale para todos; threshold: preço (target_price) ou % (below_median)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS alert_rules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL CHECK (kind IN ('target_price', 'below_median', 'all_time_low')),
+                game_id INTEGER,
+                shop_id INTEGER,
+                region_id INTEGER,
+                threshold REAL,
+                enabled INTEGER NOT NULL DEFAULT 1,
+                created_at TEXT NOT NULL
+            )
+        ''')
+
+        # Alertas disparados: fila de saída para os sinks (delivered_at) e
+        # para o aviso da interface (seen_at). reference_cents: meta, limite
+        # da mediana ou menor preço anterior
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS alert_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                rule_id INTEGER NOT NULL,
+                game_id INTEGER NOT NULL,
+                shop_id INTEGER NOT NULL,
+                region_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                price_cents INTEGER NOT NULL,
+                reference_cents INTEGER,
+                currency_id INTEGER,
+                created_at TEXT NOT NULL,
+                delivered_at TEXT,
+                seen_at TEXT,
+                UNIQUE (rule_id, game_id, shop_id, region_id, ts),
+                FOREIGN KEY (rule_id) REFERENCES alert_rules(id) ON DELETE CASCADE
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_alert_events_pending
+            ON alert_events(id) WHERE delivered_at IS NULL
+        ''')
+
+        # Última verificação de preço de cada jogo (snapshots da Steam na região padrão),
+        # mesmo quando o preço não mudou e nada foi gravado em wishlist_price_points
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS wishlist_price_checks (
+                game_id INTEGER PRIMARY KEY NOT NULL,
+                checked_at TEXT NOT NULL
+            )
+        ''')
+
+        # Jobs de sincronização executados pelo worker (python -m sync)
+        # status: pending -> running -> done | failed
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                progress INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                message TEXT,
+                worker TEXT,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT,
+                heartbeat_at TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        if "attempts" not in _table_columns(conn, "sync_jobs"):
+            cursor.execute("ALTER TABLE sync_jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_sync_jobs_status
+            ON sync_jobs(status, id)
+        ''')
+
+        # Checkpoint por item dos jobs (ex.: um jogo do histórico), para que
+        # um job retomado processe só o que ficou pendente ou falhou.
+        # status: pending -> done | failed; failed é tentado de novo a partir
+        # de next_attempt_at (segundos desde 1970, UTC)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_job_items (
+                job_id INTEGER NOT NULL,
+                item TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                next_attempt_at INTEGER,
+                updated_at INTEGER,
+                PRIMARY KEY (job_id, item),
+                FOREIGN KEY (job_id) REFERENCES sync_jobs(id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        ''')
+
+        # Valores avulsos do worker (ex.: último heartbeat)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_meta (
+                key TEXT PRIMARY KEY NOT NULL,
+                value TEXT
+            )
+        ''')
+
+        # Cache do mapeamento Steam appid -> ITAD game id
+        # itad_id NULL = jogo não encontrado na ITAD (cache negativo)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS itad_game_ids (
+                appid INTEGER PRIMARY KEY NOT NULL,
+                itad_id TEXT,
+                fetched_at TEXT NOT NULL
+            )
+        ''')
+
+        # Marca d'água da sincronização incremental do histórico ITAD por
+        # jogo e região (last_fetch_date em UTC; shops = lojas pedidas, ex.
+        # "61,35"; bytes/rows acumulados para estatísticas)
+        if "appid" in _table_columns(conn, "itad_history_sync") and \
+                "region_id" not in _table_columns(conn, "itad_history_sync"):
+            cursor.execute("ALTER TABLE itad_history_sync RENAME TO itad_history_sync_legacy")
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS itad_history_sync (
+                appid INTEGER NOT NULL,
+                region_id INTEGER NOT NULL,
+                shops TEXT NOT NULL,
+                last_fetch_date TEXT NOT NULL,
+                synced_at TEXT NOT NULL,
+                bytes_received INTEGER NOT NULL DEFAULT 0,
+                rows_received INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (appid, region_id)
+            )
+        ''')
+
+        if "appid" in _table_columns(conn, "itad_history_sync_legacy"):
+            # O layout antigo só sincronizava a Steam Brasil
+            cursor.execute('''
+                INSERT OR IGNORE INTO itad_history_sync
+                    (appid, region_id, shops, last_fetch_date, synced_at, bytes_received, rows_received)
+                SELECT appid, (SELECT id FROM regions WHERE code = ?), ?,
+                    last_fetch_date, synced_at, bytes_received, rows_received
+                FROM itad_history_sync_legacy
+            ''', (DEFAULT_REGION, str(STEAM_SHOP_ID)))
+            cursor.execute("DROP TABLE itad_history_sync_legacy")
+
+    def _migrate_legacy_prices(self, conn):
         """
+        Converte o layout antigo (wishlist_prices com price REAL, currency TEXT
+        e fetch_date TEXT, mais wishlist_latest_price) para wishlist_price_points,
+        atribuindo os preços existentes à Steam Brasil, e apaga as tabelas antigas.
+        Roda uma única vez, dentro da transação do schema.
         """
-        self.init_wishlist_database()
-        conn = sqlite3.connect(WISHLIST_DB_PATH)
-        cursor = conn.cursor()
+        if "fetch_date" not in _table_columns(conn, "wishlist_prices"):
+            return
 
-        try:
-            # Passo 1: Inserir jogo na tabela principal
-            cursor.execute('''
-            INSERT INTO wishlist_games (appid, name)
-                    VALUES (?, ?)
-            ''', (wishlist_game["appid"], wishlist_game["name"]))
-        except sqlite3.IntegrityError as e:
-            return 
-                
-        
-        conn.commit()
-        conn.close()
+        # DDL fora de transação seria confirmado antes dos dados: tudo ou nada
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
 
-    def save_wishlist_multiple_games(self, wishlist_games:list[dict]):
+        conn.execute('''
+            INSERT OR IGNORE INTO currencies (code)
+            SELECT DISTINCT currency FROM wishlist_prices WHERE currency IS NOT NULL
+        ''')
+        # Datas com fuso diferente que caem no mesmo instante viram uma só linha
+        conn.execute('''
+            INSERT OR IGNORE INTO wishlist_price_points
+                (game_id, shop_id, region_id, ts, price_cents, currency_id)
+            SELECT
+                p.game_id,
+                ?,
+                (SELECT id FROM regions WHERE code = ?),
+                CAST(strftime('%s', p.fetch_date) AS INTEGER),
+                CAST(ROUND(p.price * 100) AS INTEGER),
+                c.id
+            FROM wishlist_prices p
+            LEFT JOIN currencies c ON c.code = p.currency
+            WHERE strftime('%s', p.fetch_date) IS NOT NULL
+        ''', (STEAM_SHOP_ID, DEFAULT_REGION))
+
+        # Os triggers antigos são removidos junto com as tabelas
+        conn.execute("DROP TABLE IF EXISTS wishlist_latest_price")
+        conn.execute("DROP TABLE wishlist_prices")
+
+    def _dictionary_id(self, conn, table, code, create=True):
         """
+        Id de `code` em uma tabela de dicionário (regions, currencies).
+        Se não existir, cria (create=True) ou retorna None (consultas).
         """
-        self.init_wishlist_database()
-        conn = sqlite3.connect(WISHLIST_DB_PATH)
-        cursor = conn.cursor()
+        if code is None:
+            return None
 
-        try:
-            # Passo 1: Inserir jogo na tabela principal
-            for wishlist_game in wishlist_games:
-                cursor.execute('''
+        key = (table, code)
+        if key in self._dictionary_ids:
+            return self._dictionary_ids[key]
+
+        row = conn.execute(f"SELECT id FROM {table} WHERE code = ?", (code,)).fetchone()
+        if row is None:
+            if not create:
+                return None
+            # Não vai para o cache: a transação ainda pode ser desfeita
+            return conn.execute(f"INSERT INTO {table} (code) VALUES (?) RETURNING id", (code,)).fetchone()[0]
+
+        self._dictionary_ids[key] = row[0]
+        return row[0]
+
+    def save_wishlist_game(self, wishlist_game:dict):
+        """
+        """
+        with self._manager.transaction() as conn:
+            try:
+                # Passo 1: Inserir jogo na tabela principal
+                conn.execute('''
                 INSERT INTO wishlist_games (appid, name)
                         VALUES (?, ?)
                 ''', (wishlist_game["appid"], wishlist_game["name"]))
-        except sqlite3.IntegrityError as e:
-            return 
-                
-        
-        conn.commit()
-        conn.close()
+            except sqlite3.IntegrityError as e:
+                return
 
-    def save_wishlist_game_price(self, game_data, game_id):
+    def save_wishlist_multiple_games(self, wishlist_games):
         """
+        Insere vários jogos em uma única transação (executemany + INSERT OR IGNORE).
+        Jogos já existentes são ignorados, sem interromper o restante do lote.
+
+        Retorna {"inserted": n, "skipped": m}
+        """
+        rows = _CountingIterator(
+            (game["appid"], game["name"]) for game in wishlist_games
+        )
+
+        with self._manager.transaction() as conn:
+            cursor = conn.executemany('''
+                INSERT OR IGNORE INTO wishlist_games (appid, name)
+                VALUES (?, ?)
+            ''', rows)
+            inserted = max(cursor.rowcount, 0)
+
+        return {"inserted": inserted, "skipped": rows.count - inserted}
+
+    @metrics.timed("db.get_new_appids")
+    def get_new_appids(self, appids):
+        """
+        Appids que ainda não estão em wishlist_games (nem como removidos):
+        os únicos cujos detalhes precisam ser buscados na Steam
+        """
+        with self._manager.connection() as conn:
+            known = {row[0] for row in conn.execute("SELECT appid FROM wishlist_games")}
+        return [appid for appid in appids if appid not in known]
+
+    @metrics.timed("db.apply_wishlist_diff")
+    def apply_wishlist_diff(self, wishlist_items, new_games=()):
+        """
+        Atualiza wishlist_games a partir da wishlist atual da Steam, em uma
+        única transação que só escreve o que mudou.
+
+        wishlist_items: dicts do GetWishlist (appid, priority, date_added)
+        new_games: dicts com appid e name dos jogos novos (ver get_new_appids)
+
+        - jogos novos são inseridos; removidos que voltaram à lista são restaurados
+        - priority e date_added são atualizados quando mudam
+        - jogos que saíram da lista recebem removed_at (o histórico é mantido)
+
+        Retorna {"added": n, "restored": n, "updated": n, "removed": n}
+        """
+        items = {item["appid"]: item for item in wishlist_items}
+        listed = json.dumps(list(items))
+        now = _to_epoch(datetime.now(timezone.utc))
+
+        with self._manager.transaction() as conn:
+            added = conn.executemany('''
+                INSERT OR IGNORE INTO wishlist_games (appid, name, priority, date_added)
+                VALUES (?, ?, ?, ?)
+            ''', [
+                (game["appid"], game["name"], items[game["appid"]].get("priority"), items[game["appid"]].get("date_added"))
+                for game in new_games if game["appid"] in items
+            ]).rowcount
+            restored = conn.execute('''
+                UPDATE wishlist_games SET removed_at = NULL
+                WHERE removed_at IS NOT NULL AND appid IN (SELECT value FROM json_each(?))
+            ''', (listed,)).rowcount
+            updated = conn.executemany('''
+                UPDATE wishlist_games SET priority = ?2, date_added = ?3
+                WHERE appid = ?1 AND (priority IS NOT ?2 OR date_added IS NOT ?3)
+            ''', [(appid, item.get("priority"), item.get("date_added")) for appid, item in items.items()]).rowcount
+            removed = conn.execute('''
+                UPDATE wishlist_games SET removed_at = ?
+                WHERE removed_at IS NULL AND appid NOT IN (SELECT value FROM json_each(?))
+            ''', (now, listed)).rowcount
+            # O snapshot Parquet (columnar.py) leva a lista de jogos ativos
+            if max(added, 0) or restored or removed:
+                self._bump_prices_version(conn)
+
+        return {
+            "added": max(added, 0),
+            "restored": restored,
+            "updated": max(updated, 0),
+            "removed": removed,
+        }
+
+    @metrics.timed("db.save_wishlist_prices")
+    def save_wishlist_prices(self, price_rows, only_changes=True, shop_id=STEAM_SHOP_ID, region=DEFAULT_REGION):
+        """
+        Insere vários preços em uma única transação (um único commit/fsync).
+
+        price_rows: iterável de (appid, price, currency, fetch_date).
+        Se fetch_date for None, usa a data atual (a mesma para todo o lote).
+        Linhas com (game_id, shop_id, região, fetch_date) repetidos são ignoradas.
+
+        only_changes: não grava o preço se for igual ao último salvo do jogo
+        nesta loja/região (wishlist_current_prices); a data da verificação fica
+        em wishlist_price_checks, então o histórico só cresce com mudanças.
+
+        As regras de alerta (alert_rules) são avaliadas contra os preços novos.
+
+        Retorna {"inserted": n, "skipped": m, "alerts": k}
         """
-        self.init_wishlist_database()
-        conn = sqlite3.connect(WISHLIST_DB_PATH)
-        cursor = conn.cursor()
-        
         # Data única para todo este fetch
-        fetch_date = datetime.now(timezone.utc).isoformat(timespec='seconds')
-        
-        # Passo 3: Inserir preço relacionado ao jogo
-        cursor.execute('''
-            INSERT INTO wishlist_prices (game_id, price, currency, fetch_date)
-            VALUES (?, ?, ?, ?)
-        ''', (game_id, game_data.get("price"), game_data.get("currency"), fetch_date))
-        
-        conn.commit()
-        conn.close()
+        now = _to_epoch(datetime.now(timezone.utc))
+
+        with self._manager.transaction() as conn:
+            region_id = self._dictionary_id(conn, "regions", region)
+            rows = [
+                (appid, shop_id, region_id, _to_epoch(fetch_date) if fetch_date else now,
+                 _to_cents(price), self._dictionary_id(conn, "currencies", currency))
+                for appid, price, currency, fetch_date in price_rows
+            ]
+
+            rules = self._load_alert_rules(conn)
+            alert_batch = {}
+            self._track_alert_rows(conn, rules, alert_batch, rows)
+
+            if only_changes:
+                cursor = conn.executemany('''
+                    INSERT OR IGNORE INTO wishlist_price_points
+                        (game_id, shop_id, region_id, ts, price_cents, currency_id)
+                    SELECT ?1, ?2, ?3, ?4, ?5, ?6
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM wishlist_current_prices c
+                        WHERE c.game_id = ?1
+                          AND c.shop_id = ?2
+                          AND c.region_id = ?3
+                          AND c.price_cents IS ?5
+                          AND c.currency_id IS ?6
+                          AND c.ts <= ?4
+                    )
+                ''', rows)
+            else:
+                cursor = conn.executemany('''
+                    INSERT OR IGNORE INTO wishlist_price_points
+                        (game_id, shop_id, region_id, ts, price_cents, currency_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', rows)
+            inserted = max(cursor.rowcount, 0)
+            if inserted:
+                self._bump_prices_version(conn)
+            alerts = self._evaluate_alerts(conn, rules, alert_batch)
+
+            if shop_id == STEAM_SHOP_ID and region == DEFAULT_REGION:
+                conn.executemany('''
+                    INSERT INTO wishlist_price_checks (game_id, checked_at)
+                    VALUES (?, strftime('%Y-%m-%dT%H:%M:%S+00:00', ?, 'unixepoch'))
+                    ON CONFLICT(game_id) DO UPDATE SET checked_at = MAX(checked_at, excluded.checked_at)
+                ''', [(row[0], row[3]) for row in rows])
+
+        return {"inserted": inserted, "skipped": len(rows) - inserted, "alerts": alerts}
+
+    @metrics.timed("db.compact_prices")
+    def compact_prices(self):
+        """
+        Reescreve wishlist_price_points em forma "só mudanças": apaga os pontos
+        cujo preço e moeda são iguais ao ponto anterior do mesmo jogo/loja/região,
+        guarda a data do último ponto removido em wishlist_price_checks e roda VACUUM.
+
+        Retorna {"rows_removed", "bytes_before", "bytes_after", "bytes_reclaimed"}
+        """
+        bytes_before = self._database_size()
+
+        with self._manager.transaction() as conn:
+            conn.execute('''
+                CREATE TEMP TABLE redundant_prices AS
+                SELECT game_id, shop_id, region_id, ts FROM (
+                    SELECT game_id, shop_id, region_id, ts, price_cents, currency_id,
+                        LAG(price_cents) OVER w AS prev_price,
+                        LAG(currency_id) OVER w AS prev_currency,
+                        ROW_NUMBER() OVER w AS rn
+                    FROM wishlist_price_points
+                    WINDOW w AS (PARTITION BY game_id, shop_id, region_id ORDER BY ts)
+                )
+                WHERE rn > 1 AND price_cents IS prev_price AND currency_id IS prev_currency
+            ''')
+
+            # A verificação mais recente continua registrada (a tabela só
+            # acompanha a Steam na região padrão, como em save_wishlist_prices)
+            conn.execute('''
+                INSERT INTO wishlist_price_checks (game_id, checked_at)
+                SELECT game_id, strftime('%Y-%m-%dT%H:%M:%S+00:00', MAX(ts), 'unixepoch')
+                FROM redundant_prices
+                WHERE shop_id = ? AND region_id = ?
+                GROUP BY game_id
+                ON CONFLICT(game_id) DO UPDATE SET checked_at = MAX(checked_at, excluded.checked_at)
+            ''', (STEAM_SHOP_ID, self._dictionary_id(conn, "regions", DEFAULT_REGION, create=False)))
 
+            rows_removed = conn.execute('''
+                DELETE FROM wishlist_price_points
+                WHERE (game_id, shop_id, region_id, ts) IN (
+                    SELECT game_id, shop_id, region_id, ts FROM redundant_prices
+                )
+            ''').rowcount
+            conn.execute("DROP TABLE redundant_prices")
+            if rows_removed:
+                self._bump_prices_version(conn)
+
+        # VACUUM não pode rodar dentro de uma transação
+        with self._manager.connection() as conn:
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        bytes_after = self._database_size()
+        return {
+            "rows_removed": rows_removed,
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "bytes_reclaimed": bytes_before - bytes_after
+        }
+
+    def _database_size(self):
+        """Tamanho do banco em bytes (páginas em uso + livres)"""
+        with self._manager.connection() as conn:
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+
+    def save_wishlist_game_price(self, game_data, game_id):
+        """
+        Salva o preço atual de um único jogo.
+        Para vários jogos, prefira save_wishlist_prices (um único commit).
+        """
+        return self.save_wishlist_prices(
+            [(game_id, game_data.get("price"), game_data.get("currency"), None)]
+        )
+
+    @metrics.timed("db.get_latest_wishlist")
     def get_latest_wishlist(self):
+        """
+        Jogos que estão na wishlist (sem os removidos):
+        (appid, name, priority, date_added)
+        """
         try:
-            conn = sqlite3.connect(WISHLIST_DB_PATH)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT 
-                *
-                FROM wishlist_games g
-                ORDER BY g.name
-            ''',)
-            
-            rows = cursor.fetchall()
-            conn.close()
-            
+            with self._manager.connection() as conn:
+                cursor = conn.execute('''
+                    SELECT g.appid, g.name, g.priority, g.date_added
+                    FROM wishlist_games g
+                    WHERE g.removed_at IS NULL
+                    ORDER BY g.name
+                ''',)
+                rows = cursor.fetchall()
+
             return {
                 "items": rows
             }
         except Exception as e:
             print(f"Erro ao buscar wishlist: {e}")
             return None
-        
-    def get_prices_for_game(self,appid):
+
+    @metrics.timed("db.get_wishlist_game_names")
+    def get_wishlist_game_names(self):
+        """
+        Lista leve (appid, name) dos jogos da wishlist (sem os removidos) que
+        têm ao menos um preço salvo, para preencher o seletor de jogos sem
+        carregar o histórico.
+        """
         try:
-            conn = sqlite3.connect(WISHLIST_DB_PATH)
-            cursor = conn.cursor()
-            
-            # JOIN entre as tabelas para pegar dados completos
-            cursor.execute('''
-                SELECT 
-                *
-                FROM wishlist_prices 
-                WHERE game_id = ?
-                ORDER BY g.fetch_date DESC
-            ''', (appid))
-            
-            rows = cursor.fetchall()
-            conn.close()
-            
+            with self._manager.connection() as conn:
+                cursor = conn.execute('''
+                    SELECT g.appid, g.name
+                    FROM wishlist_games g
+                    WHERE g.removed_at IS NULL AND EXISTS (
+                        SELECT 1 FROM wishlist_price_points p WHERE p.game_id = g.appid
+                    )
+                    ORDER BY g.name
+                ''')
+                rows = cursor.fetchall()
+
             return {
                 "items": rows
             }
         except Exception as e:
-            print(f"Erro ao buscar wishlist: {e}")
+            print(f"Erro ao buscar jogos: {e}")
             return None
 
-    def get_latest_wishlist_with_prices(self):
+    @metrics.timed("db.get_prices_for_game")
+    def get_prices_for_game(self, appid, months=None, shop_id=STEAM_SHOP_ID, region=DEFAULT_REGION):
         """
+        Histórico de um único jogo em uma loja/região: (price, currency, ts)
+        em ordem cronológica, com ts em segundos desde 1970 (UTC), que o
+        pandas converte bem mais rápido que texto ISO 8601.
+
+        Como só as mudanças de preço são gravadas, na série da Steam o preço
+        vigente é estendido até a última verificação (wishlist_price_checks)
+        com um ponto final sintético, para o gráfico não parar na última mudança.
+
+        months: se informado, retorna apenas a janela dos últimos `months` meses
+        (contados a partir da última verificação, com 1 dia de folga) mais o
+        último preço anterior à janela, usado como âncora do gráfico.
+
+        Lê apenas o intervalo (game, shop, region) da chave primária, então o
+        custo depende só das linhas do jogo/janela, não do tamanho da tabela.
         """
         try:
-            conn = sqlite3.connect(WISHLIST_DB_PATH)
-            cursor = conn.cursor()
-            
-            # JOIN entre as tabelas para pegar dados completos
-            cursor.execute('''
-                SELECT 
-                    g.appid,
-                    g.name,
-                    p.price,
-                    p.currency,
-                    p.fetch_date
-                FROM wishlist_games g
-                INNER JOIN wishlist_prices p ON g.appid = p.game_id
-                ORDER BY g.name
-            ''',)
-            
-            rows = cursor.fetchall()
-            conn.close()
-            
+            with self._manager.connection() as conn:
+                region_id = self._dictionary_id(conn, "regions", region, create=False)
+                checked_ts = None
+                if shop_id == STEAM_SHOP_ID and region == DEFAULT_REGION:
+                    checked_ts = self._last_price_check(conn, appid)
+                if months is None:
+                    cursor = conn.execute('''
+                        SELECT p.price_cents / 100.0, c.code, p.ts
+                        FROM wishlist_price_points p
+                        LEFT JOIN currencies c ON c.id = p.currency_id
+                        WHERE p.game_id = ? AND p.shop_id = ? AND p.region_id = ?
+                        ORDER BY p.ts
+                    ''', (appid, shop_id, region_id))
+                else:
+                    cursor = conn.execute('''
+                        WITH bounds AS (
+                            SELECT CAST(strftime('%s', MAX(MAX(ts), COALESCE(?5, 0)), 'unixepoch', ?4, '-1 day') AS INTEGER) AS start
+                            FROM wishlist_price_points
+                            WHERE game_id = ?1 AND shop_id = ?2 AND region_id = ?3
+                        )
+                        SELECT w.price_cents / 100.0, c.code, w.ts
+                        FROM (
+                            SELECT p.ts, p.price_cents, p.currency_id
+                            FROM wishlist_price_points p, bounds b
+                            WHERE p.game_id = ?1 AND p.shop_id = ?2 AND p.region_id = ?3
+                              AND p.ts >= b.start
+                            UNION ALL
+                            SELECT * FROM (
+                                SELECT p.ts, p.price_cents, p.currency_id
+                                FROM wishlist_price_points p, bounds b
+                                WHERE p.game_id = ?1 AND p.shop_id = ?2 AND p.region_id = ?3
+                                  AND p.ts < b.start
+                                ORDER BY p.ts DESC
+                                LIMIT 1
+                            )
+                        ) w
+                        LEFT JOIN currencies c ON c.id = w.currency_id
+                        ORDER BY w.ts
+                    ''', (appid, shop_id, region_id, f"-{int(months)} months", checked_ts))
+                rows = cursor.fetchall()
+
+            if rows and checked_ts and checked_ts > rows[-1][2]:
+                rows.append((rows[-1][0], rows[-1][1], checked_ts))
+
+            return {
+                "items": rows
+            }
+        except Exception as e:
+            print(f"Erro ao buscar preços do jogo {appid}: {e}")
+            return None
+
+    def _last_price_check(self, conn, appid):
+        row = conn.execute('''
+            SELECT CAST(strftime('%s', checked_at) AS INTEGER)
+            FROM wishlist_price_checks WHERE game_id = ?
+        ''', (appid,)).fetchone()
+        return row[0] if row else None
+
+    def get_last_price_check(self, appid):
+        """Data (datetime UTC) da última verificação do preço do jogo na Steam, ou None"""
+        with self._manager.connection() as conn:
+            checked_ts = self._last_price_check(conn, appid)
+        return datetime.fromtimestamp(checked_ts, timezone.utc) if checked_ts else None
+
+    @metrics.timed("db.get_latest_prices")
+    def get_latest_prices(self, shop_id=STEAM_SHOP_ID, region=DEFAULT_REGION):
+        """
+        Preço atual de cada jogo na loja/região, lido da tabela materializada
+        wishlist_current_prices: (appid, name, price, currency, fetch_date)
+        """
+        try:
+            with self._manager.connection() as conn:
+                region_id = self._dictionary_id(conn, "regions", region, create=False)
+                cursor = conn.execute('''
+                    SELECT
+                        g.appid,
+                        g.name,
+                        l.price_cents / 100.0,
+                        c.code,
+                        strftime('%Y-%m-%dT%H:%M:%S+00:00', l.ts, 'unixepoch')
+                    FROM wishlist_games g
+                    INNER JOIN wishlist_current_prices l ON l.game_id = g.appid
+                    LEFT JOIN currencies c ON c.id = l.currency_id
+                    WHERE l.shop_id = ? AND l.region_id = ? AND g.removed_at IS NULL
+                    ORDER BY g.name
+                ''', (shop_id, region_id))
+                rows = cursor.fetchall()
+
+            return {
+                "items": rows
+            }
+        except Exception as e:
+            print(f"Erro ao buscar preços atuais: {e}")
+            return None
+
+    @metrics.timed("db.get_wishlist_price_summary")
+    def get_wishlist_price_summary(self, low_window_days=90, shop_id=STEAM_SHOP_ID, region=DEFAULT_REGION):
+        """
+        Resumo de preços de todos os jogos em uma única consulta agregada
+        (funções de janela sobre wishlist_price_points; o preço atual vem de
+        wishlist_current_prices), sem carregar o histórico:
+
+        (appid, name, current_price, currency, all_time_low, recent_low,
+         pct_off, last_change)
+
+        - recent_low: menor preço vigente nos últimos low_window_days dias (inclui
+          o atual e o que vigorava no início da janela)
+        - pct_off: desconto do preço atual em relação ao maior preço registrado
+        - last_change: data do último ponto em que o preço mudou
+        """
+        cutoff = _to_epoch(datetime.now(timezone.utc) - timedelta(days=low_window_days))
+
+        try:
+            with self._manager.connection() as conn:
+                region_id = self._dictionary_id(conn, "regions", region, create=False)
+                cursor = conn.execute('''
+                    WITH ordered AS (
+                        SELECT
+                            game_id, price_cents, ts,
+                            LAG(price_cents) OVER (PARTITION BY game_id ORDER BY ts) AS prev_price,
+                            LEAD(ts) OVER (PARTITION BY game_id ORDER BY ts) AS next_ts
+                        FROM wishlist_price_points
+                        WHERE shop_id = ?1 AND region_id = ?2
+                          AND price_cents IS NOT NULL
+                    ),
+                    stats AS (
+                        SELECT
+                            game_id,
+                            MIN(price_cents) AS all_time_low,
+                            MAX(price_cents) AS all_time_high,
+                            -- Preços que vigoraram na janela: os do período e o vigente na abertura dela
+                            MIN(CASE WHEN ts >= ?3 OR next_ts IS NULL OR next_ts > ?3 THEN price_cents END) AS window_low,
+                            MAX(CASE WHEN prev_price IS NULL OR price_cents <> prev_price THEN ts END) AS last_change
+                        FROM ordered
+                        GROUP BY game_id
+                    )
+                    SELECT
+                        g.appid,
+                        g.name,
+                        l.price_cents / 100.0 AS current_price,
+                        c.code AS currency,
+                        s.all_time_low / 100.0,
+                        MIN(l.price_cents, COALESCE(s.window_low, l.price_cents)) / 100.0 AS recent_low,
+                        CASE WHEN s.all_time_high > 0
+                            THEN ROUND(100.0 * (s.all_time_high - l.price_cents) / s.all_time_high, 1)
+                        END AS pct_off,
+                        strftime('%Y-%m-%dT%H:%M:%S+00:00', s.last_change, 'unixepoch')
+                    FROM wishlist_games g
+                    INNER JOIN wishlist_current_prices l
+                        ON l.game_id = g.appid AND l.shop_id = ?1 AND l.region_id = ?2
+                    INNER JOIN stats s ON s.game_id = g.appid
+                    LEFT JOIN currencies c ON c.id = l.currency_id
+                    WHERE g.removed_at IS NULL
+                    ORDER BY g.name
+                ''', (shop_id, region_id, cutoff))
+                rows = cursor.fetchall()
+
+            return {
+                "items": rows
+            }
+        except Exception as e:
+            print(f"Erro ao buscar resumo de preços: {e}")
+            return None
+
+    @metrics.timed("db.get_latest_wishlist_with_prices")
+    def get_latest_wishlist_with_prices(self, shop_id=STEAM_SHOP_ID, region=DEFAULT_REGION):
+        """
+        """
+        try:
+            with self._manager.connection() as conn:
+                region_id = self._dictionary_id(conn, "regions", region, create=False)
+                # JOIN entre as tabelas para pegar dados completos
+                cursor = conn.execute('''
+                    SELECT
+                        g.appid,
+                        g.name,
+                        p.price_cents / 100.0,
+                        c.code,
+                        strftime('%Y-%m-%dT%H:%M:%S+00:00', p.ts, 'unixepoch')
+                    FROM wishlist_games g
+                    INNER JOIN wishlist_price_points p ON g.appid = p.game_id
+                    LEFT JOIN currencies c ON c.id = p.currency_id
+                    WHERE p.shop_id = ? AND p.region_id = ? AND g.removed_at IS NULL
+                    ORDER BY g.name
+                ''', (shop_id, region_id))
+                rows = cursor.fetchall()
+
             return {
                 "items": rows
             }
@@ -204,84 +1118,699 @@ class WishlistDatabase:
             print(f"Erro ao buscar wishlist: {e}")
             return None
 
+    def get_history_sync_state(self, appid, region=DEFAULT_REGION, shop_ids=(STEAM_SHOP_ID,)):
+        """
+        Estado da sincronização incremental do histórico ITAD de um jogo/região:
+        {"last_fetch_date", "synced_at", "bytes_received", "rows_received"} ou None.
+        Se a última sincronização pediu outras lojas, o estado não vale (None).
+        """
+        with self._manager.connection() as conn:
+            region_id = self._dictionary_id(conn, "regions", region, create=False)
+            row = conn.execute('''
+                SELECT last_fetch_date, synced_at, bytes_received, rows_received
+                FROM itad_history_sync
+                WHERE appid = ? AND region_id = ? AND shops = ?
+            ''', (appid, region_id, ",".join(map(str, shop_ids)))).fetchone()
+
+        if row is None:
+            return None
+        return dict(zip(("last_fetch_date", "synced_at", "bytes_received", "rows_received"), row))
+
+    def save_history_sync_state(self, appid, last_fetch_date, bytes_received, rows_received,
+                                region=DEFAULT_REGION, shop_ids=(STEAM_SHOP_ID,)):
+        """
+        Atualiza a marca d'água do jogo/região (nunca retrocede, a não ser que
+        as lojas pedidas mudem) e acumula bytes/pontos recebidos, usados para
+        estimar o tráfego evitado.
+        """
+        synced_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        last_fetch_date = last_fetch_date.astimezone(timezone.utc).isoformat(timespec='seconds')
+        shops = ",".join(map(str, shop_ids))
+
+        with self._manager.transaction() as conn:
+            region_id = self._dictionary_id(conn, "regions", region)
+            conn.execute('''
+                INSERT INTO itad_history_sync
+                    (appid, region_id, shops, last_fetch_date, synced_at, bytes_received, rows_received)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(appid, region_id) DO UPDATE SET
+                    last_fetch_date = CASE WHEN shops = excluded.shops
+                        THEN MAX(last_fetch_date, excluded.last_fetch_date)
+                        ELSE excluded.last_fetch_date END,
+                    shops = excluded.shops,
+                    synced_at = excluded.synced_at,
+                    bytes_received = bytes_received + excluded.bytes_received,
+                    rows_received = rows_received + excluded.rows_received
+            ''', (appid, region_id, shops, last_fetch_date, synced_at, bytes_received, rows_received))
+
+    def count_prices_between(self, appid, start, end, region=DEFAULT_REGION, shop_ids=(STEAM_SHOP_ID,)):
+        """Quantidade de preços salvos do jogo nas lojas/região com start <= data < end"""
+        shop_ids = list(shop_ids)
+        placeholders = ",".join("?" * len(shop_ids))
+
+        with self._manager.connection() as conn:
+            region_id = self._dictionary_id(conn, "regions", region, create=False)
+            return conn.execute(f'''
+                SELECT COUNT(*)
+                FROM wishlist_price_points
+                WHERE game_id = ? AND shop_id IN ({placeholders}) AND region_id = ?
+                  AND ts >= ? AND ts < ?
+            ''', (appid, *shop_ids, region_id, _to_epoch(start), _to_epoch(end))).fetchone()[0]
+
+    def get_itad_game_ids(self, appids):
+        """
+        Busca o mapeamento appid -> ITAD game id salvo.
+        Retorna {appid: (itad_id ou None, fetched_at)} apenas para os appids em cache.
+        """
+        appids = list(appids)
+        mapping = {}
+
+        with self._manager.connection() as conn:
+            # Em blocos para não passar do limite de parâmetros do SQLite
+            for start in range(0, len(appids), 500):
+                chunk = appids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                cursor = conn.execute(f'''
+                    SELECT appid, itad_id, fetched_at
+                    FROM itad_game_ids
+                    WHERE appid IN ({placeholders})
+                ''', chunk)
+                for appid, itad_id, fetched_at in cursor:
+                    mapping[appid] = (itad_id, fetched_at)
+
+        return mapping
+
+    def save_itad_game_ids(self, mapping):
+        """
+        Salva {appid: itad_id} (itad_id None = não encontrado) em uma única transação.
+        """
+        fetched_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+        with self._manager.transaction() as conn:
+            conn.executemany('''
+                INSERT INTO itad_game_ids (appid, itad_id, fetched_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(appid) DO UPDATE SET
+                    itad_id = excluded.itad_id,
+                    fetched_at = excluded.fetched_at
+            ''', [(appid, itad_id, fetched_at) for appid, itad_id in mapping.items()])
+
+    def create_sync_job(self, kind):
+        """
+        Enfileira um job (kind: "wishlist", "prices" ou "history").
+        Se já houver um job do mesmo tipo pendente ou em execução, retorna o id dele.
+        Se o último job do tipo falhou com itens por fazer, ele volta para a
+        fila e continua de onde parou (as falhas ganham novas tentativas).
+        """
+        now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+        with self._manager.transaction() as conn:
+            row = conn.execute('''
+                SELECT id FROM sync_jobs
+                WHERE kind = ? AND status IN ('pending', 'running')
+                ORDER BY id LIMIT 1
+            ''', (kind,)).fetchone()
+            if row:
+                return row[0]
+
+            row = conn.execute('''
+                SELECT j.id FROM sync_jobs j
+                WHERE j.id = (SELECT MAX(id) FROM sync_jobs WHERE kind = ?)
+                  AND j.status = 'failed'
+                  AND EXISTS (SELECT 1 FROM sync_job_items i WHERE i.job_id = j.id AND i.status != 'done')
+            ''', (kind,)).fetchone()
+            if row:
+                conn.execute('''
+                    UPDATE sync_jobs
+                    SET status = 'pending', attempts = 0, message = 'Retomando de onde parou', finished_at = NULL
+                    WHERE id = ?
+                ''', (row[0],))
+                conn.execute('''
+                    UPDATE sync_job_items SET status = 'pending', attempts = 0, next_attempt_at = NULL
+                    WHERE job_id = ? AND status = 'failed'
+                ''', (row[0],))
+                return row[0]
+
+            return conn.execute('''
+                INSERT INTO sync_jobs (kind, status, created_at) VALUES (?, 'pending', ?)
+            ''', (kind, now)).lastrowid
+
+    def claim_sync_job(self, worker):
+        """Marca o job pendente mais antigo como running. Retorna (id, kind) ou None"""
+        now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+        with self._manager.transaction() as conn:
+            return conn.execute('''
+                UPDATE sync_jobs
+                SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ?, attempts = attempts + 1
+                WHERE id = (
+                    SELECT id FROM sync_jobs WHERE status = 'pending' ORDER BY id LIMIT 1
+                )
+                RETURNING id, kind
+            ''', (worker, now, now)).fetchone()
+
+    def update_sync_job(self, job_id, progress, total, message=None):
+        now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+        with self._manager.transaction() as conn:
+            conn.execute('''
+                UPDATE sync_jobs
+                SET progress = ?, total = ?, message = COALESCE(?, message), heartbeat_at = ?
+                WHERE id = ?
+            ''', (progress, total, message, now, job_id))
+
+    def finish_sync_job(self, job_id, status, message):
+        """
+        Encerra o job. Se concluído, os checkpoints dos itens que deram certo
+        são apagados (os com falha ficam para consulta); se falhou, todos
+        ficam, para o job ser retomado (create_sync_job)
+        """
+        now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+        with self._manager.transaction() as conn:
+            conn.execute('''
+                UPDATE sync_jobs
+                SET status = ?, message = ?, finished_at = ?, heartbeat_at = ?
+                WHERE id = ?
+            ''', (status, message, now, now, job_id))
+            if status == "done":
+                conn.execute("DELETE FROM sync_job_items WHERE job_id = ? AND status = 'done'", (job_id,))
+
+    def recover_stale_sync_jobs(self, stale_after, dead_workers=(), max_attempts=SYNC_JOB_MAX_ATTEMPTS):
+        """
+        Jobs running sem heartbeat há mais de stale_after (timedelta), ou de
+        um worker em dead_workers (processo que já não existe), voltam para a
+        fila, para continuar de onde pararam; os que já foram executados
+        max_attempts vezes são marcados como failed.
+        Retorna {"requeued": n, "failed": m}
+        """
+        cutoff = (datetime.now(timezone.utc) - stale_after).isoformat(timespec='seconds')
+        dead = json.dumps(list(dead_workers))
+
+        with self._manager.transaction() as conn:
+            failed = conn.execute('''
+                UPDATE sync_jobs
+                SET status = 'failed', message = 'Interrompido (worker parou de responder)'
+                WHERE status = 'running' AND attempts >= ?3
+                  AND (heartbeat_at < ?1 OR worker IN (SELECT value FROM json_each(?2)))
+            ''', (cutoff, dead, max_attempts)).rowcount
+            requeued = conn.execute('''
+                UPDATE sync_jobs
+                SET status = 'pending', message = 'Interrompido, será retomado'
+                WHERE status = 'running'
+                  AND (heartbeat_at < ?1 OR worker IN (SELECT value FROM json_each(?2)))
+            ''', (cutoff, dead)).rowcount
+
+        return {"requeued": requeued, "failed": failed}
+
+    def set_sync_job_items(self, job_id, items):
+        """
+        Registra os itens (chaves texto, ex. appid) de um job. Itens já
+        registrados mantêm o estado, então um job retomado não refaz o que
+        terminou; itens inacabados que não estão mais em items são descartados
+        """
+        items = [str(item) for item in items]
+
+        with self._manager.transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO sync_job_items (job_id, item) VALUES (?, ?)",
+                [(job_id, item) for item in items]
+            )
+            conn.execute('''
+                DELETE FROM sync_job_items
+                WHERE job_id = ? AND status != 'done' AND item NOT IN (SELECT value FROM json_each(?))
+            ''', (job_id, json.dumps(items)))
+
+    def get_sync_job_items(self, job_id, max_attempts):
+        """
+        Itens a processar agora: pendentes e falhas com menos de max_attempts
+        tentativas cujo backoff já passou
+        """
+        now = _to_epoch(datetime.now(timezone.utc))
+
+        with self._manager.connection() as conn:
+            rows = conn.execute('''
+                SELECT item FROM sync_job_items
+                WHERE job_id = ?1 AND (
+                    status = 'pending'
+                    OR (status = 'failed' AND attempts < ?2 AND next_attempt_at <= ?3)
+                )
+            ''', (job_id, max_attempts, now)).fetchall()
+
+        return [row[0] for row in rows]
+
+    def get_next_sync_job_retry(self, job_id, max_attempts):
+        """Próxima nova tentativa (datetime UTC) de um item com falha, ou None se não houver"""
+        with self._manager.connection() as conn:
+            row = conn.execute('''
+                SELECT MIN(next_attempt_at) FROM sync_job_items
+                WHERE job_id = ? AND status = 'failed' AND attempts < ?
+            ''', (job_id, max_attempts)).fetchone()
+
+        return None if row[0] is None else datetime.fromtimestamp(row[0], timezone.utc)
+
+    def checkpoint_sync_job_items(self, job_id, items, error=None, retry_delay=0):
+        """
+        Marca itens como done (error None) ou failed, guardando o erro. A nova
+        tentativa de um item com falha fica para daqui a retry_delay segundos,
+        dobrando a cada falha (backoff exponencial)
+        """
+        now = _to_epoch(datetime.now(timezone.utc))
+
+        with self._manager.transaction() as conn:
+            if error is None:
+                conn.executemany('''
+                    UPDATE sync_job_items SET status = 'done', error = NULL, updated_at = ?
+                    WHERE job_id = ? AND item = ?
+                ''', [(now, job_id, str(item)) for item in items])
+            else:
+                # À direita do SET, attempts ainda é o valor anterior
+                conn.executemany('''
+                    UPDATE sync_job_items
+                    SET status = 'failed', error = ?1, attempts = attempts + 1,
+                        next_attempt_at = ?2 + ?3 * (1 << attempts), updated_at = ?2
+                    WHERE job_id = ?4 AND item = ?5
+                ''', [(str(error), now, retry_delay, job_id, str(item)) for item in items])
+
+    def get_sync_job_item_counts(self, job_id):
+        """Quantidade de itens do job por status: {"pending", "done", "failed"}"""
+        with self._manager.connection() as conn:
+            rows = conn.execute('''
+                SELECT status, COUNT(*) FROM sync_job_items WHERE job_id = ? GROUP BY status
+            ''', (job_id,)).fetchall()
+
+        return {"pending": 0, "done": 0, "failed": 0, **dict(rows)}
+
+    def get_sync_jobs(self, limit=10, status=None):
+        """
+        Jobs mais recentes (só os com esse status, se informado), como dicts:
+        id, kind, status, progress, total, message, created_at, started_at, finished_at, heartbeat_at, worker
+        """
+        columns = ("id", "kind", "status", "progress", "total", "message",
+                   "created_at", "started_at", "finished_at", "heartbeat_at", "worker")
+
+        with self._manager.connection() as conn:
+            rows = conn.execute(f'''
+                SELECT {", ".join(columns)}
+                FROM sync_jobs
+                WHERE ?2 IS NULL OR status = ?2
+                ORDER BY id DESC
+                LIMIT ?1
+            ''', (limit, status)).fetchall()
+
+        return [dict(zip(columns, row)) for row in rows]
+
+    # ---- Alertas de preço ----
+
+    def _load_alert_rules(self, conn):
+        """Regras ativas: [(id, kind, game_id, shop_id, region_id, threshold)]"""
+        return conn.execute('''
+            SELECT id, kind, game_id, shop_id, region_id, threshold
+            FROM alert_rules
+            WHERE enabled = 1
+        ''').fetchall()
+
+    @staticmethod
+    def _matching_rules(rules, key):
+        game_id, shop_id, region_id = key
+        return [
+            rule for rule in rules
+            if rule[2] in (None, game_id) and rule[3] in (None, shop_id) and rule[4] in (None, region_id)
+        ]
+
+    def _price_state(self, conn, key):
+        """Preço atual e estatísticas de (game, shop, region), lidos pela chave primária"""
+        current = conn.execute('''
+            SELECT ts, price_cents FROM wishlist_current_prices
+            WHERE game_id = ? AND shop_id = ? AND region_id = ?
+        ''', key).fetchone()
+        stats = conn.execute('''
+            SELECT low_cents, median_cents, median_at FROM wishlist_price_stats
+            WHERE game_id = ? AND shop_id = ? AND region_id = ?
+        ''', key).fetchone()
+        ts, cents = current or (None, None)
+        low, median, median_at = stats or (None, None, None)
+        return {"ts": ts, "cents": cents, "low": low, "median": median, "median_at": median_at}
+
+    def _track_alert_rows(self, conn, rules, batch, rows):
+        """
+        Acompanha, antes de `rows` serem gravadas, o que os alertas precisam
+        de cada jogo/loja/região: o estado anterior (preço atual e
+        estatísticas), o ponto mais novo do lote e o menor preço entre os
+        demais pontos do lote. Só visita as linhas novas: O(len(rows)).
+        """
+        if not rules:
+            return
+        window_start = _to_epoch(datetime.now(timezone.utc)) - MEDIAN_WINDOW_DAYS * 24 * 60 * 60
+        for game_id, shop_id, region_id, ts, cents, currency_id in rows:
+            if cents is None:
+                continue
+            key = (game_id, shop_id, region_id)
+            entry = batch.get(key)
+            if entry is None:
+                if not self._matching_rules(rules, key):
+                    continue
+                entry = batch[key] = {"prior": self._price_state(conn, key), "last": None, "older_low": None}
+
+            # Como o trigger trg_price_stats_median_backfill, para o estado já lido
+            prior = entry["prior"]
+            if prior["median_at"] is not None and window_start <= ts < prior["median_at"]:
+                prior["median_at"] = None
+
+            last = entry["last"]
+            if last is None or ts > last[0]:
+                older, entry["last"] = last, (ts, cents, currency_id)
+            else:
+                older = (ts, cents)
+            if older is not None and (entry["older_low"] is None or older[1] < entry["older_low"]):
+                entry["older_low"] = older[1]
+
+    def _price_median(self, conn, key, state, now):
+        """
+        Mediana dos últimos MEDIAN_WINDOW_DAYS dias, ponderada pelo tempo em
+        que cada preço vigorou. Lê só a janela (faixa da chave primária) e fica
+        guardada em wishlist_price_stats por até MEDIAN_MAX_AGE
+        """
+        if state["median_at"] is not None and now - state["median_at"] < MEDIAN_MAX_AGE:
+            return state["median"]
+
+        start = now - MEDIAN_WINDOW_DAYS * 24 * 60 * 60
+        points = conn.execute('''
+            SELECT ts, price_cents FROM (
+                SELECT ts, price_cents FROM wishlist_price_points
+                WHERE game_id = ?1 AND shop_id = ?2 AND region_id = ?3 AND ts >= ?4
+                UNION ALL
+                SELECT * FROM (
+                    SELECT ts, price_cents FROM wishlist_price_points
+                    WHERE game_id = ?1 AND shop_id = ?2 AND region_id = ?3 AND ts < ?4
+                    ORDER BY ts DESC
+                    LIMIT 1
+                )
+            )
+            ORDER BY ts
+        ''', (*key, start)).fetchall()
+
+        # Tempo (s) em que cada preço vigorou dentro da janela
+        durations = {}
+        for (ts, cents), (next_ts, _) in zip(points, points[1:] + [(now, None)]):
+            if cents is not None:
+                durations[cents] = durations.get(cents, 0) + max(0, next_ts - max(ts, start))
+
+        median = None
+        total = sum(durations.values())
+        if total:
+            elapsed = 0
+            for cents in sorted(durations):
+                elapsed += durations[cents]
+                if elapsed * 2 >= total:
+                    median = cents
+                    break
+        elif points:
+            median = points[-1][1]
+
+        conn.execute('''
+            UPDATE wishlist_price_stats SET median_cents = ?, median_at = ?
+            WHERE game_id = ? AND shop_id = ? AND region_id = ?
+        ''', (median, now, *key))
+        state["median"], state["median_at"] = median, now
+        return median
+
+    def _evaluate_alerts(self, conn, rules, batch):
+        """
+        Avalia as regras contra o lote acompanhado por _track_alert_rows, já
+        gravado, na mesma transação. Para cada jogo/loja/região só o ponto mais
+        novo conta, e só se ele for mais novo que o preço atual anterior e
+        tiver outro preço (histórico antigo chegando da ITAD não dispara):
+
+        - target_price / below_median: o preço cruzou o limite (antes acima, agora <=)
+        - all_time_low: preço abaixo do menor anterior (banco + demais pontos do lote)
+
+        Compara com as estatísticas pré-calculadas, sem reler o histórico
+        (a mediana é recalculada no máximo uma vez por dia). Grava os disparos
+        em alert_events e retorna quantos foram gravados.
+        """
+        if not batch:
+            return 0
+
+        now = _to_epoch(datetime.now(timezone.utc))
+        created_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        events = []
+        for key, entry in batch.items():
+            prior = entry["prior"]
+            ts, cents, currency_id = entry["last"]
+            previous = prior["cents"]
+            if (prior["ts"] is not None and ts <= prior["ts"]) or cents == previous:
+                continue
+
+            lows = [low for low in (prior["low"], entry["older_low"]) if low is not None]
+            for rule_id, kind, _, _, _, threshold in self._matching_rules(rules, key):
+                if kind == "all_time_low":
+                    reference = min(lows) if lows else None
+                    hit = reference is not None and cents < reference
+                else:
+                    if kind == "target_price":
+                        reference = _to_cents(threshold)
+                    else:
+                        median = self._price_median(conn, key, prior, now)
+                        reference = None if median is None else int(median * (1 - threshold / 100))
+                    hit = reference is not None and cents <= reference and (previous is None or previous > reference)
+
+                if hit:
+                    events.append((rule_id, *key, ts, cents, reference, currency_id, created_at))
+
+        if events:
+            conn.executemany('''
+                INSERT OR IGNORE INTO alert_events
+                    (rule_id, game_id, shop_id, region_id, ts, price_cents, reference_cents, currency_id, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', events)
+            metrics.count("alerts.fired", len(events))
+        return len(events)
+
+    def add_alert_rule(self, kind, threshold=None, appid=None, shop_id=None, region=None):
+        """
+        Cria uma regra de alerta. appid/shop_id/region None = todos.
+        threshold: preço em reais (target_price) ou % abaixo da mediana (below_median).
+        Retorna o id da regra
+        """
+        if kind not in ALERT_KINDS:
+            raise ValueError(f"kind deve ser um de {ALERT_KINDS}")
+        if kind != "all_time_low" and threshold is None:
+            raise ValueError(f"{kind} precisa de threshold")
+        if kind == "target_price" and threshold <= 0:
+            raise ValueError("target_price espera um preço maior que zero")
+        if kind == "below_median" and not 0 < threshold < 100:
+            raise ValueError("below_median espera um percentual entre 0 e 100")
+
+        now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        with self._manager.transaction() as conn:
+            region_id = self._dictionary_id(conn, "regions", region)
+            return conn.execute('''
+                INSERT INTO alert_rules (kind, game_id, shop_id, region_id, threshold, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (kind, appid, shop_id, region_id, threshold, now)).lastrowid
+
+    def delete_alert_rule(self, rule_id):
+        with self._manager.transaction() as conn:
+            conn.execute("DELETE FROM alert_events WHERE rule_id = ?", (rule_id,))
+            conn.execute("DELETE FROM alert_rules WHERE id = ?", (rule_id,))
+
+    def get_alert_rules(self):
+        """
+        Regras cadastradas, como dicts:
+        id, kind, appid, name, shop_id, region, threshold, enabled, created_at
+        """
+        columns = ("id", "kind", "appid", "name", "shop_id", "region", "threshold", "enabled", "created_at")
+
+        with self._manager.connection() as conn:
+            rows = conn.execute('''
+                SELECT r.id, r.kind, r.game_id, g.name, r.shop_id, rg.code, r.threshold, r.enabled, r.created_at
+                FROM alert_rules r
+                LEFT JOIN wishlist_games g ON g.appid = r.game_id
+                LEFT JOIN regions rg ON rg.id = r.region_id
+                ORDER BY r.id
+            ''').fetchall()
+
+        return [dict(zip(columns, row)) for row in rows]
+
+    def get_alert_events(self, pending=False, unseen=False, limit=100):
+        """
+        Alertas disparados, do mais antigo para o mais novo, como dicts:
+        id, kind, threshold, appid, name, shop, region, price, reference,
+        currency, price_date, created_at.
+
+        pending: só os ainda não entregues aos sinks; unseen: só os não
+        dispensados na interface
+        """
+        columns = ("id", "kind", "threshold", "appid", "name", "shop", "region", "price",
+                   "reference", "currency", "price_date", "created_at")
+        conditions = ["1 = 1"]
+        if pending:
+            conditions.append("e.delivered_at IS NULL")
+        if unseen:
+            conditions.append("e.seen_at IS NULL")
+
+        with self._manager.connection() as conn:
+            rows = conn.execute(f'''
+                SELECT
+                    e.id, r.kind, r.threshold, e.game_id, g.name, s.name, rg.code,
+                    e.price_cents / 100.0, e.reference_cents / 100.0, c.code,
+                    strftime('%Y-%m-%dT%H:%M:%S+00:00', e.ts, 'unixepoch'),
+                    e.created_at
+                FROM alert_events e
+                INNER JOIN alert_rules r ON r.id = e.rule_id
+                LEFT JOIN wishlist_games g ON g.appid = e.game_id
+                LEFT JOIN shops s ON s.id = e.shop_id
+                LEFT JOIN regions rg ON rg.id = e.region_id
+                LEFT JOIN currencies c ON c.id = e.currency_id
+                WHERE {" AND ".join(conditions)}
+                ORDER BY e.id
+                LIMIT ?
+            ''', (limit,)).fetchall()
+
+        return [dict(zip(columns, row)) for row in rows]
+
+    def mark_alert_events(self, event_ids, delivered=False, seen=False):
+        """Marca alertas como entregues aos sinks e/ou dispensados na interface"""
+        now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        with self._manager.transaction() as conn:
+            conn.executemany('''
+                UPDATE alert_events
+                SET delivered_at = CASE WHEN ?1 THEN COALESCE(delivered_at, ?3) ELSE delivered_at END,
+                    seen_at = CASE WHEN ?2 THEN COALESCE(seen_at, ?3) ELSE seen_at END
+                WHERE id = ?4
+            ''', [(delivered, seen, now, event_id) for event_id in event_ids])
+
+    def _bump_prices_version(self, conn):
+        """Marca, na transação corrente, que os preços mudaram (ver get_prices_version)"""
+        conn.execute('''
+            INSERT INTO sync_meta (key, value) VALUES (?, '1')
+            ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+        ''', (PRICES_VERSION_KEY,))
+
+    def get_prices_version(self):
+        """
+        Versão persistente de wishlist_price_points: muda a cada gravação,
+        de qualquer processo, e quando jogos entram ou saem da wishlist. Usada para saber se um snapshot Parquet
+        (columnar.py) ainda corresponde ao banco
+        """
+        return int(self.get_sync_meta(PRICES_VERSION_KEY) or 0)
+
+    def get_sync_meta(self, key):
+        with self._manager.connection() as conn:
+            row = conn.execute("SELECT value FROM sync_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_sync_meta(self, key, value):
+        with self._manager.transaction() as conn:
+            conn.execute('''
+                INSERT INTO sync_meta (key, value) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value
+            ''', (key, value))
+
+    def get_sync_meta_prefix(self, prefix):
+        """Valores das chaves que começam com prefix, como {chave: valor}"""
+        with self._manager.connection() as conn:
+            rows = conn.execute(
+                "SELECT key, value FROM sync_meta WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            ).fetchall()
+        return dict(rows)
+
+    def delete_sync_meta(self, key):
+        with self._manager.transaction() as conn:
+            conn.execute("DELETE FROM sync_meta WHERE key = ?", (key,))
+
     # Função auxiliar para visualizar a estrutura
     def show_database_structure(self):
         """
         Mostra a estrutura das tabelas e exemplos de dados.
         Útil para entender como os dados estão organizados.
         """
-        conn = sqlite3.connect(WISHLIST_DB_PATH)
-        cursor = conn.cursor()
-        
-        print("\n=== ESTRUTURA DO BANCO DE DADOS ===\n")
-        
-        # Estrutura da tabela wishlist_games
-        print("📋 Tabela: wishlist_games")
-        cursor.execute("PRAGMA table_info(wishlist_games)")
-        for col in cursor.fetchall():
-            print(f"  - {col[1]} ({col[2]})")
-        
-        cursor.execute("SELECT COUNT(*) FROM wishlist_games")
-        count = cursor.fetchone()[0]
-        print(f"  Total de registros: {count}\n")
-        
-        # Estrutura da tabela wishlist_prices
-        print("💰 Tabela: wishlist_prices")
-        cursor.execute("PRAGMA table_info(wishlist_prices)")
-        for col in cursor.fetchall():
-            print(f"  - {col[1]} ({col[2]})")
-        
-        cursor.execute("SELECT COUNT(*) FROM wishlist_prices")
-        count = cursor.fetchone()[0]
-        print(f"  Total de registros: {count}\n")
-        
-        conn.close()
+        with self._manager.connection() as conn:
+            cursor = conn.cursor()
+
+            print("\n=== ESTRUTURA DO BANCO DE DADOS ===\n")
+
+            # Estrutura da tabela wishlist_games
+            print("📋 Tabela: wishlist_games")
+            cursor.execute("PRAGMA table_info(wishlist_games)")
+            for col in cursor.fetchall():
+                print(f"  - {col[1]} ({col[2]})")
+
+            cursor.execute("SELECT COUNT(*) FROM wishlist_games")
+            count = cursor.fetchone()[0]
+            print(f"  Total de registros: {count}\n")
+
+            # Estrutura da tabela wishlist_price_points
+            print("💰 Tabela: wishlist_price_points")
+            cursor.execute("PRAGMA table_info(wishlist_price_points)")
+            for col in cursor.fetchall():
+                print(f"  - {col[1]} ({col[2]})")
+
+            cursor.execute("SELECT COUNT(*) FROM wishlist_price_points")
+            count = cursor.fetchone()[0]
+            print(f"  Total de registros: {count}\n")
+
+    @metrics.timed("db.save_price_history_stream")
+    def save_price_history_stream(self, appid, entries, chunk_size=500, region=DEFAULT_REGION):
+        """
+        Grava um histórico consumindo `entries` (iterável de dicts com
+        fetch_date, price, currency e, opcionalmente, shop_id/shop_name; sem
+        shop_id = Steam) em lotes de chunk_size com executemany, em uma única
+        transação: só um lote fica em memória por vez.
+
+        Não filtra preços repetidos (ver dedupe_consecutive_prices). As regras
+        de alerta são avaliadas uma vez, no fim, contra o ponto mais novo de
+        cada loja. Erros são propagados e a transação é desfeita. Retorna o
+        número de linhas inseridas
+        """
+        entries = iter(entries)
+        saved_count = 0
+
+        with self._manager.transaction() as conn:
+            region_id = self._dictionary_id(conn, "regions", region)
+            known_shops = {row[0] for row in conn.execute("SELECT id FROM shops")}
+            rules = self._load_alert_rules(conn)
+            alert_batch = {}
+
+            while True:
+                chunk = []
+                for entry in islice(entries, chunk_size):
+                    shop_id = entry.get("shop_id", STEAM_SHOP_ID)
+                    if shop_id not in known_shops:
+                        conn.execute("INSERT OR IGNORE INTO shops (id, name) VALUES (?, ?)",
+                                     (shop_id, entry.get("shop_name")))
+                        known_shops.add(shop_id)
+                    chunk.append((
+                        appid, shop_id, region_id, _to_epoch(entry["fetch_date"]),
+                        _to_cents(entry["price"]), self._dictionary_id(conn, "currencies", entry["currency"])
+                    ))
+                if not chunk:
+                    break
+
+                self._track_alert_rows(conn, rules, alert_batch, chunk)
+                cursor = conn.executemany('''
+                    INSERT OR IGNORE INTO wishlist_price_points
+                    (game_id, shop_id, region_id, ts, price_cents, currency_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', chunk)
+                saved_count += max(cursor.rowcount, 0)
+
+            if saved_count:
+                self._bump_prices_version(conn)
+            self._evaluate_alerts(conn, rules, alert_batch)
+
+        return saved_count
 
     def save_price_history_to_db(self, appid, price_history):
         if not price_history:
             return 0
-        
-        conn = sqlite3.connect(WISHLIST_DB_PATH)
-        cursor = conn.cursor()
-        
+
         try:
-            # Começa transação
-            cursor.execute('BEGIN TRANSACTION')
-            
-            # 2. Processa todas as mudanças de preço
-            saved_count = 0
-            last_price = None
-            
-            # Ordena por fetch_date
+            # Ordena por fetch_date e pula os pontos em que o preço não mudou
             price_history.sort(key=lambda x: x["fetch_date"])
-            
-            for entry in price_history:
-                # Pula se preço não mudou
-                if entry["price"] == last_price:
-                    continue
-                
-                last_price = entry["price"]
-                
-                # Converte fetch_date
-                datetime = entry["fetch_date"]
-                
-                # 3. INSERÇÃO ATÔMICA com OR IGNORE
-                cursor.execute('''
-                    INSERT OR IGNORE INTO wishlist_prices 
-                    (game_id, price, currency, fetch_date)
-                    VALUES (?, ?, ?, ?)
-                ''', (appid, entry["price"], entry["currency"], datetime))
-                
-                if cursor.rowcount > 0:
-                    saved_count += 1
-            
-            # Commit da transação
-            conn.commit()
-            return saved_count
-            
+            return self.save_price_history_stream(appid, dedupe_consecutive_prices(price_history))
+
         except Exception as e:
-            conn.rollback()
             print(f"Erro na transação: {e}")
             return 0
-        finally:
-            conn.close()
\ No newline at end of file
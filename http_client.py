@@ -0,0 +1,331 @@
+import codecs
+import json
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import metrics
+
+# requests (~0,1 s de import) só é carregado quando uma requisição é feita ou
+# um HttpClient é criado: quem só importa os clientes (ex. a interface) não paga
+
+HTTP_CACHE_PATH = Path(__file__).parent / "http_cache.db"
+
+# Status que indicam sobrecarga/limite e valem nova tentativa
+RETRY_STATUS = {429, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Rate limiter token bucket, seguro para uso entre threads.
+
+    - rate: tokens repostos por segundo (requisições/s)
+    - capacity: tamanho máximo do burst (padrão: rate, mínimo 1)
+    - name: identifica o limiter nas métricas de espera (rate_limit.wait)
+    """
+
+    def __init__(self, rate, capacity=None, name="default"):
+        if rate <= 0:
+            raise ValueError("rate deve ser maior que zero")
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self.name = name
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Bloqueia até haver tokens disponíveis. Retorna o tempo esperado (s)"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    metrics.observe("rate_limit.wait", waited, limiter=self.name)
+                    return waited
+
+                wait = (tokens - self._tokens) / self.rate
+
+            time.sleep(wait)
+            waited += wait
+
+
+def retry_delay(response, attempt, backoff=0.5, max_delay=60):
+    """
+    Tempo de espera antes da próxima tentativa: usa Retry-After (em segundos)
+    quando o servidor informa; senão, backoff exponencial com jitter.
+    """
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), max_delay)
+        except ValueError:
+            pass  # Retry-After em formato de data: usa o backoff
+    return min(backoff * 2 ** attempt, max_delay) * random.uniform(0.5, 1.5)
+
+
+def _endpoint(url):
+    """host + caminho, sem a query: rótulo das métricas HTTP"""
+    parts = urlsplit(url)
+    return parts.netloc + parts.path
+
+
+def request_with_retries(method, url, session=None, rate_limiter=None, max_retries=3, **kwargs):
+    """
+    Faz a requisição respeitando o rate limiter e repetindo em 429/5xx
+    transitórios e erros de conexão. A última resposta é devolvida
+    (o chamador decide se usa raise_for_status).
+    """
+    import requests
+
+    http = session or requests
+    endpoint = _endpoint(url) if metrics.is_enabled() else None
+    attempt = 0
+    while True:
+        if rate_limiter:
+            rate_limiter.acquire()
+
+        start = time.perf_counter()
+        try:
+            response = http.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.count("http.errors", endpoint=endpoint, error=type(e).__name__)
+            if attempt >= max_retries:
+                raise
+            delay = retry_delay(None, attempt)
+            metrics.observe("http.retry_wait", delay, endpoint=endpoint)
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        # Até os cabeçalhos (o corpo de respostas com stream=True ainda não foi lido)
+        metrics.observe("http.request", time.perf_counter() - start, method=method, endpoint=endpoint)
+        metrics.count("http.responses", endpoint=endpoint, status=response.status_code)
+
+        if response.status_code not in RETRY_STATUS or attempt >= max_retries:
+            return response
+
+        # Lê o corpo (pequeno) para a conexão voltar ao pool: respostas
+        # com stream=True ainda não foram lidas
+        response.content
+        delay = retry_delay(response, attempt)
+        metrics.observe("http.retry_wait", delay, endpoint=endpoint)
+        time.sleep(delay)
+        attempt += 1
+
+
+class ResponseCache:
+    """
+    Cache de respostas GET em disco (SQLite), por URL + parâmetros.
+
+    - Dentro do TTL a resposta salva é devolvida sem ir à rede
+    - Depois do TTL, se havia ETag/Last-Modified, a requisição é condicional
+      e um 304 apenas renova a entrada
+    """
+
+    def __init__(self, path=HTTP_CACHE_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS http_cache (
+                key TEXT PRIMARY KEY NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                stored_at REAL NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    @staticmethod
+    def key(url, params):
+        import requests
+
+        return requests.Request("GET", url, params=params).prepare().url
+
+    def get(self, key):
+        """Retorna (headers, body, stored_at) ou None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT headers, body, stored_at FROM http_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def set(self, key, response):
+        headers = {
+            name: response.headers[name]
+            for name in ("Content-Type", "ETag", "Last-Modified")
+            if name in response.headers
+        }
+        with self._lock:
+            self._conn.execute('''
+                INSERT OR REPLACE INTO http_cache (key, headers, body, stored_at)
+                VALUES (?, ?, ?, ?)
+            ''', (key, json.dumps(headers), response.content, time.time()))
+            self._conn.commit()
+
+    def touch(self, key):
+        with self._lock:
+            self._conn.execute("UPDATE http_cache SET stored_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _cached_response(url, headers, body):
+    import requests
+    from requests.structures import CaseInsensitiveDict
+
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = body
+    response.from_cache = True
+    return response
+
+
+class HttpClient:
+    """
+    Transporte HTTP compartilhado pelos clientes Steam e ITAD.
+
+    - Uma requests.Session com keep-alive; no máximo max_per_host conexões
+      simultâneas por host (as demais threads aguardam no pool)
+    - Repetição automática com backoff e jitter (request_with_retries)
+    - Cache opcional de GETs (cache_ttl por chamada, ver ResponseCache)
+    """
+
+    def __init__(self, max_per_host=8, max_retries=3, cache=None, timeout=10):
+        self.max_retries = max_retries
+        self.cache = cache
+        self.timeout = timeout
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max_per_host, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, url, params=None, rate_limiter=None, cache_ttl=None, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        use_cache = self.cache is not None and cache_ttl and method == "GET"
+
+        cached = None
+        if use_cache:
+            key = ResponseCache.key(url, params)
+            cached = self.cache.get(key)
+            if cached:
+                headers, body, stored_at = cached
+                if time.time() - stored_at < cache_ttl:
+                    metrics.count("http.cache", result="hit")
+                    return _cached_response(url, headers, body)
+
+                # Expirado: revalida com ETag/Last-Modified quando disponíveis
+                conditional = {}
+                if "ETag" in headers:
+                    conditional["If-None-Match"] = headers["ETag"]
+                if "Last-Modified" in headers:
+                    conditional["If-Modified-Since"] = headers["Last-Modified"]
+                kwargs["headers"] = {**conditional, **kwargs.get("headers", {})}
+
+        response = request_with_retries(
+            method, url, session=self.session, rate_limiter=rate_limiter,
+            max_retries=self.max_retries, params=params, **kwargs
+        )
+
+        if use_cache:
+            if response.status_code == 304 and cached:
+                metrics.count("http.cache", result="revalidated")
+                self.cache.touch(key)
+                return _cached_response(url, cached[0], cached[1])
+            if response.status_code == 200:
+                metrics.count("http.cache", result="miss")
+                self.cache.set(key, response)
+
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+def get_http_client():
+    """HttpClient do processo (com cache em disco em HTTP_CACHE_PATH)"""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient(cache=ResponseCache())
+        return _shared_client
+
+
+def iter_json_array(fileobj, chunk_size=64 * 1024, encoding="utf-8"):
+    """
+    Lê um array JSON (`[{...}, {...}]`) de um arquivo binário e gera cada
+    elemento assim que ele termina de chegar, sem carregar o documento
+    inteiro. A memória usada fica na ordem do maior elemento + chunk_size.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+
+    while True:
+        # Pula espaços; a abertura do array é consumida uma única vez e,
+        # depois dela, só espaços e vírgulas entre os elementos
+        separators = " \t\r\n," if started else " \t\r\n"
+        while position < len(buffer) and buffer[position] in separators:
+            position += 1
+
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError("documento JSON não é um array")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # Um elemento só está completo se seguido de um delimitador
+                # (ex.: "1." pode ser o começo de "1.5") ou no fim do arquivo
+                if eof or (end < len(buffer) and buffer[end] in " \t\r\n,]"):
+                    yield item
+                    position = end
+                    continue
+
+        if eof:
+            if started:
+                raise ValueError("array JSON incompleto")
+            return
+
+        # Precisa de mais dados: descarta o que já foi lido e acrescenta um chunk
+        chunk = fileobj.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + text_decoder.decode(chunk, final=eof)
+        position = 0
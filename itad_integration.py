@@ -1,131 +1,427 @@
-import requests
-import os
-from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
-import sqlite3
-from pathlib import Path
-import time
-from data import *
+import tempfile
+import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from data import DEFAULT_REGION, STEAM_SHOP_ID, WishlistDatabase, dedupe_consecutive_prices
+from http_client import TokenBucket, get_http_client, iter_json_array
+import metrics
+
+
+class LRUCache:
+    """Cache LRU simples em memória (OrderedDict)"""
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        if key not in self._data:
+            return default
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def set(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+# Mapeamento appid -> (game id, fetched_at) compartilhado entre instâncias do
+# cliente (o Streamlit recria o ITADClient a cada rerun); os TTLs valem
+# também aqui, já que o worker fica rodando por dias
+_game_id_cache = LRUCache()
+
+
+def peak_memory_kb():
+    """Pico de memória alocada (KB) segundo o tracemalloc, ou None se ele não estiver ativo"""
+    if not tracemalloc.is_tracing():
+        return None
+    return tracemalloc.get_traced_memory()[1] // 1024
 
-load_dotenv()
-ITAD_API_KEY = os.getenv("ITAD_API_KEY")
 
 class ITADClient:
     """Cliente para interagir com a ITAD API"""
     
     BASE_URL = "https://api.isthereanydeal.com"
+    STEAM_SHOP_ID = 61
+    # Validade do cache de game ids (jogos não encontrados expiram antes)
+    GAME_ID_TTL = timedelta(days=180)
+    NOT_FOUND_TTL = timedelta(days=7)
+    LOOKUP_BATCH_SIZE = 200
+    # Orçamento de requisições compartilhado por lookups e históricos
+    REQUESTS_PER_SECOND = 4
+    MAX_WORKERS = 4
+    # Respostas do histórico ficam em memória até este tamanho, depois em disco
+    HISTORY_SPOOL_SIZE = 1024 * 1024
+    HISTORY_CHUNK_SIZE = 500
     
-    def __init__(self, api_key):
+    def __init__(self, api_key, db=None, base_url=None, requests_per_second=None, http=None,
+                 shops=None, country=None):
         self.api_key = api_key
-        
-    def get_game_id_from_appid(self, appid):
-        """
-        Converte Steam AppID para ITAD Game ID
-        """
-        url = f"{self.BASE_URL}/games/lookup/v1"
+        self.db = db or WishlistDatabase()
+        self.base_url = base_url or self.BASE_URL
+        # Lojas (ids da ITAD) e país dos históricos; padrão: só a Steam Brasil
+        self.shops = tuple(shops or (self.STEAM_SHOP_ID,))
+        self.country = country or DEFAULT_REGION
+        self.rate_limiter = TokenBucket(requests_per_second or self.REQUESTS_PER_SECOND, name="itad")
+        # Transporte compartilhado com o steamclient (keep-alive e retries)
+        self.http = http or get_http_client()
+
+    def _request(self, method, url, **kwargs):
+        """Requisição sob o rate limiter, com backoff em 429 (Retry-After) e 5xx"""
+        return self.http.request(method, url, rate_limiter=self.rate_limiter, timeout=10, **kwargs)
+
+    @metrics.timed("itad.lookup")
+    def _lookup_game_id(self, appid):
+        """Consulta a ITAD. Retorna o game id, None se não existir; erros são propagados"""
+        url = f"{self.base_url}/games/lookup/v1"
         params = {
             "key": self.api_key,
             "appid": appid
         }
-        
+
+        response = self._request("GET", url, params=params)
+        response.raise_for_status()
+        data = response.json()
+
+        if data.get("game"):
+            return data["game"]["id"]
+        return None
+
+    def get_game_id_from_appid(self, appid):
+        """
+        Converte Steam AppID para ITAD Game ID
+        """
         try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data.get("game"):
-                return data["game"]["id"]
-            return None
+            return self._lookup_game_id(appid)
         except Exception as e:
             print(f"Erro ao buscar game_id para appid {appid}: {e}")
             return None
+
+    @metrics.timed("itad.lookup_batch")
+    def get_game_ids_from_appids(self, appids):
+        """
+        Converte vários Steam AppIDs de uma vez (POST /lookup/id/shop/61/v1).
+        Retorna {appid: game_id ou None}. Se o lote falhar, consulta um a um;
+        appids com erro ficam fora do resultado (para não entrarem no cache).
+        """
+        url = f"{self.base_url}/lookup/id/shop/{self.STEAM_SHOP_ID}/v1"
+        appids = list(appids)
+        game_ids = {}
+
+        for start in range(0, len(appids), self.LOOKUP_BATCH_SIZE):
+            batch = appids[start:start + self.LOOKUP_BATCH_SIZE]
+
+            try:
+                response = self._request(
+                    "POST",
+                    url,
+                    params={"key": self.api_key},
+                    json=[f"app/{appid}" for appid in batch]
+                )
+                response.raise_for_status()
+                data = response.json()
+                for appid in batch:
+                    game_ids[appid] = data.get(f"app/{appid}")
+            except Exception as e:
+                print(f"Erro no lookup em lote ({len(batch)} jogos), buscando individualmente: {e}")
+                for appid in batch:
+                    try:
+                        game_ids[appid] = self._lookup_game_id(appid)
+                    except Exception as e:
+                        print(f"Erro ao buscar game_id para appid {appid}: {e}")
+
+        return game_ids
+
+    def _is_fresh(self, itad_id, fetched_at):
+        ttl = self.GAME_ID_TTL if itad_id else self.NOT_FOUND_TTL
+        return datetime.fromisoformat(fetched_at) > datetime.now(timezone.utc) - ttl
+
+    def resolve_game_ids(self, appids):
+        """
+        Resolve appid -> game id usando, em ordem: LRU em memória, tabela
+        itad_game_ids e, só para o que faltar ou expirou, o lookup em lote.
+        Retorna {appid: game_id ou None}.
+        """
+        resolved = {}
+        missing = []
+
+        for appid in appids:
+            entry = _game_id_cache.get(appid)
+            if entry is not None and self._is_fresh(*entry):
+                resolved[appid] = entry[0]
+            else:
+                missing.append(appid)
+
+        if missing:
+            cached = self.db.get_itad_game_ids(missing)
+            to_fetch = []
+            for appid in missing:
+                if appid in cached and self._is_fresh(*cached[appid]):
+                    resolved[appid] = cached[appid][0]
+                    _game_id_cache.set(appid, cached[appid])
+                else:
+                    to_fetch.append(appid)
+
+            if to_fetch:
+                fetched = self.get_game_ids_from_appids(to_fetch)
+                self.db.save_itad_game_ids(fetched)
+                fetched_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+                for appid in to_fetch:
+                    resolved[appid] = fetched.get(appid)
+                    if appid in fetched:
+                        _game_id_cache.set(appid, (fetched[appid], fetched_at))
+
+        return resolved
+
+    def resolve_game_id(self, appid):
+        """Versão de resolve_game_ids para um único appid"""
+        return self.resolve_game_ids([appid])[appid]
     
-    def get_price_history(self, game_id, months=12):
+    def get_price_history(self, game_id, months=12, since=None):
         """
         Busca histórico de preços para um jogo específico
-        Retorna apenas dados da Steam
+        Retorna os dados das lojas em self.shops, no país self.country
+
+        since: datetime a partir do qual buscar (padrão: últimos `months` meses)
         """
-        url = f"{self.BASE_URL}/games/history/v2"
+        spool, _ = self._download_price_history(game_id, months, since)
+        if spool is None:
+            return []
+
+        with spool:
+            try:
+                return list(self.iter_price_history(spool))
+            except Exception as e:
+                print(f"Erro ao ler histórico para game_id {game_id}: {e}")
+                return []
+
+    @metrics.timed("itad.history_download")
+    def _download_price_history(self, game_id, months=12, since=None):
+        """
+        Baixa o histórico sem decodificar o JSON, para um arquivo temporário
+        (em memória até HISTORY_SPOOL_SIZE, depois em disco).
+        Retorna (arquivo no início, bytes recebidos) ou (None, 0) em caso de erro
+        """
+        if since is None:
+            since = datetime.now(timezone.utc) - timedelta(days=30*months)
+
+        url = f"{self.base_url}/games/history/v2"
         params = {
             "key": self.api_key,
             "id": game_id,
-            "shops": 61,
-            "country": "BR",
-            "since": (datetime.now() - timedelta(days=30*months)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            "shops": ",".join(map(str, self.shops)),
+            "country": self.country,
+            "since": since.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
         }
-        
+
+        spool = None
         try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            #price history is a list of json, each json is a price entry
-            price_history = response.json()
-            
-            return self._parse_history_response(price_history)
+            with self._request("GET", url, params=params, stream=True) as response:
+                response.raise_for_status()
+                spool = tempfile.SpooledTemporaryFile(max_size=self.HISTORY_SPOOL_SIZE)
+                received_bytes = 0
+                for chunk in response.iter_content(64 * 1024):
+                    spool.write(chunk)
+                    received_bytes += len(chunk)
+
+            spool.seek(0)
+            return spool, received_bytes
         except Exception as e:
+            if spool is not None:
+                spool.close()
             print(f"Erro ao buscar histórico para game_id {game_id}: {e}")
-            return []
-    
+            return None, 0
+
+    def iter_price_history(self, fileobj):
+        """
+        Gera as entradas do histórico conforme o JSON é lido do arquivo
+        (price history is a list of json, each json is a price entry)
+        """
+        for entry in iter_json_array(fileobj):
+            yield self._parse_history_entry(entry)
+
+    def _parse_history_entry(self, entry):
+        deal_info = entry.get("deal", {})
+        shop = entry.get("shop") or {}
+
+        return {
+            "shop_id": shop.get("id", self.STEAM_SHOP_ID),
+            "shop_name": shop.get("name"),
+            "fetch_date": entry.get("timestamp"),
+            "price": deal_info.get("price", {}).get("amount", 0),
+            "currency": deal_info.get("price", {}).get("currency", "BRL"),
+        }
+
     def _parse_history_response(self, price_history):
         """
-        Processa a resposta da API e extrai apenas mudanças de preço
+        Processa a resposta da API (já decodificada) e extrai as mudanças de preço
         """
-        price_changes = []
-        
-        if not price_history or not isinstance(price_history, list) or len(price_history) == 0:
-            return price_changes
+        if not price_history or not isinstance(price_history, list):
+            return []
 
-        # Processa histórico
-        for entry in price_history:
-        
-            deal_info = entry.get("deal", {})
-            
-            price_changes.append({
-                "fetch_date": entry.get("timestamp"),
-                "price": deal_info.get("price", {}).get("amount", 0),
-                "currency": deal_info.get("price", {}).get("currency", "BRL"),
-            })
-        
-        return price_changes
+        return [self._parse_history_entry(entry) for entry in price_history]
 
 
-    def fetch_price_history_for_game(self, appid, name, months=12):
+    def _plan_history_fetch(self, appid, months, incremental):
         """
-        Busca e salva histórico de preços para um jogo específico
+        Lê o estado de sincronização (apenas leitura no banco) e define a janela:
+        retorna (window_start, since, sync_state)
         """
-        # Passo 1: Converter AppID para ITAD Game ID
-        game_id = self.get_game_id_from_appid(appid)
-        
-        if not game_id:
+        window_start = datetime.now(timezone.utc) - timedelta(days=30*months)
+        since = window_start
+        sync_state = None
+        if incremental:
+            sync_state = self.db.get_history_sync_state(appid, region=self.country, shop_ids=self.shops)
+        if sync_state:
+            since = max(window_start, datetime.fromisoformat(sync_state["last_fetch_date"]))
+        return window_start, since, sync_state
+
+    @staticmethod
+    def _track_history(entries, stats):
+        """Repassa as entradas contando-as e guardando o maior fetch_date em stats"""
+        for entry in entries:
+            stats["rows"] += 1
+            fetch_date = datetime.fromisoformat(entry["fetch_date"])
+            if stats["last_fetch_date"] is None or fetch_date > stats["last_fetch_date"]:
+                stats["last_fetch_date"] = fetch_date
+            yield entry
+
+    @metrics.timed("itad.history_store")
+    def _store_history(self, appid, name, game_id, plan, spool, received_bytes):
+        """
+        Grava o histórico baixado e a marca d'água; retorna o resultado do jogo.
+
+        O arquivo é processado em fluxo: parse -> descarte de preços repetidos
+        -> inserção em lotes de HISTORY_CHUNK_SIZE, sem montar a lista inteira.
+        """
+        window_start, since, sync_state = plan
+
+        # Falha de rede/API: não é o mesmo que "sem mudanças", vale tentar de novo
+        if spool is None:
             return {
                 "success": False,
-                "message": f"Jogo {name} não encontrado na ITAD",
-                "records": 0
+                "message": f"Erro ao baixar histórico de {name}",
+                "records": 0,
+                "retryable": True
             }
 
-        # Passo 2: Buscar histórico
-        price_history = self.get_price_history(game_id, months=months)
-        
-        if not price_history:
+        # Estimativa do que deixou de ser transferido: pontos já salvos entre
+        # o início da janela e `since`, ao tamanho médio observado por ponto
+        rows_avoided = bytes_avoided = 0
+        if since > window_start:
+            rows_avoided = self.db.count_prices_between(
+                appid, window_start, since, region=self.country, shop_ids=self.shops
+            )
+            if sync_state["rows_received"]:
+                bytes_avoided = int(rows_avoided * sync_state["bytes_received"] / sync_state["rows_received"])
+
+        # Passo 3: Salvar no banco (a ITAD envia do mais recente para o mais
+        # antigo, então de cada sequência de preços iguais fica a última)
+        stats = {"rows": 0, "last_fetch_date": None}
+        try:
+            with spool:
+                entries = self._track_history(self.iter_price_history(spool), stats)
+                saved_count = self.db.save_price_history_stream(
+                    appid,
+                    dedupe_consecutive_prices(entries, keep="last"),
+                    chunk_size=self.HISTORY_CHUNK_SIZE,
+                    region=self.country
+                )
+        except Exception as e:
+            print(f"Erro ao salvar histórico de {name}: {e}")
+            return {
+                "success": False,
+                "message": f"Erro ao salvar histórico de {name}: {e}",
+                "records": 0,
+                "retryable": True
+            }
+
+        if not stats["rows"]:
+            if sync_state:
+                return {
+                    "success": True,
+                    "message": f"Sem mudanças de preço novas para {name}",
+                    "records": 0,
+                    "bytes": received_bytes,
+                    "rows_avoided": rows_avoided,
+                    "bytes_avoided": bytes_avoided
+                }
             return {
                 "success": False,
                 "message": f"Nenhum histórico encontrado para {name} {game_id}",
                 "records": 0
             }
-        # Passo 3: Salvar no banco
-        wishllist_instance = WishlistDatabase()
-        saved_count = wishllist_instance.save_price_history_to_db(appid, price_history)
-        
+
+        # Passo 4: Atualiza a marca d'água (maior fetch_date recebido)
+        self.db.save_history_sync_state(
+            appid, stats["last_fetch_date"], received_bytes, stats["rows"],
+            region=self.country, shop_ids=self.shops
+        )
+
         return {
             "success": True,
             "message": f"✅ {saved_count} mudanças de preço salvas para {name}",
-            "records": saved_count
+            "records": saved_count,
+            "bytes": received_bytes,
+            "rows_avoided": rows_avoided,
+            "bytes_avoided": bytes_avoided
         }
 
+    def _not_found_result(self, name, retryable=False):
+        """retryable: o lookup falhou (rede/API), ao invés de a ITAD não conhecer o jogo"""
+        if retryable:
+            return {
+                "success": False,
+                "message": f"Erro ao buscar o jogo {name} na ITAD",
+                "records": 0,
+                "retryable": True
+            }
+        return {
+            "success": False,
+            "message": f"Jogo {name} não encontrado na ITAD",
+            "records": 0
+        }
 
-    def fetch_all_wishlist_history(self, wishlist_items, progress_callback=None, months=12):
+    def fetch_price_history_for_game(self, appid, name, months=12, incremental=True):
         """
+        Busca e salva histórico de preços para um jogo específico
+
+        incremental: busca apenas a partir da última data já sincronizada
+        (itad_history_sync), ao invés da janela completa de `months` meses
         """
-        if not ITAD_API_KEY:
+        # Passo 1: Converter AppID para ITAD Game ID (usa o cache)
+        game_id = self.resolve_game_id(appid)
+        
+        if not game_id:
+            return self._not_found_result(name)
+
+        # Passo 2: Buscar histórico (só o que for novo, se já sincronizado)
+        plan = self._plan_history_fetch(appid, months, incremental)
+        spool, received_bytes = self._download_price_history(game_id, months=months, since=plan[1])
+
+        return self._store_history(appid, name, game_id, plan, spool, received_bytes)
+
+
+    def fetch_all_wishlist_history(self, wishlist_items, progress_callback=None, months=12,
+                                   incremental=True, max_workers=None):
+        """
+        Busca o histórico de todos os jogos (incremental por padrão)
+
+        Os downloads rodam em paralelo (max_workers), limitados pelo rate
+        limiter do cliente (REQUESTS_PER_SECOND, com backoff em 429). Leituras,
+        gravações no banco e progress_callback(i, total, result) acontecem
+        apenas na thread que chamou, que é a única escritora do SQLite.
+
+        Cada result traz o appid; falhas transitórias (rede, API, gravação)
+        têm "retryable": True.
+        """
+        if not self.api_key:
             return {
                 "success": False,
                 "message": "Configure ITAD_API_KEY no arquivo .env"
@@ -133,25 +429,58 @@ class ITADClient:
         
         results = []
         total = len(wishlist_items)
-        
-        for i, (appid, name) in enumerate(wishlist_items, 1):
-            result = self.fetch_price_history_for_game(appid, name, months)
+
+        # Resolve todos os game ids de uma vez (cache + lookup em lote)
+        game_ids = self.resolve_game_ids([appid for appid, _ in wishlist_items])
+        # Sem game id e sem registro no cache (nem negativo): o lookup falhou
+        unresolved = [appid for appid, game_id in game_ids.items() if not game_id]
+        known_missing = self.db.get_itad_game_ids(unresolved) if unresolved else {}
+
+        def report(appid, result):
+            result["appid"] = appid
             results.append(result)
-            
             # Callback de progresso
             if progress_callback:
-                progress_callback(i, total, result)
-            
-            # Rate limiting: aguarda 1 segundo entre requisições
-            if i < total:
-                time.sleep(1)
+                progress_callback(len(results), total, result)
+
+        with ThreadPoolExecutor(max_workers=max_workers or self.MAX_WORKERS) as executor:
+            futures = {}
+            for appid, name in wishlist_items:
+                game_id = game_ids.get(appid)
+                if not game_id:
+                    report(appid, self._not_found_result(name, retryable=appid not in known_missing))
+                    continue
+
+                plan = self._plan_history_fetch(appid, months, incremental)
+                future = executor.submit(self._download_price_history, game_id, months, plan[1])
+                futures[future] = (appid, name, game_id, plan)
+
+            try:
+                for future in as_completed(futures):
+                    appid, name, game_id, plan = futures[future]
+                    spool, received_bytes = future.result()
+                    report(appid, self._store_history(appid, name, game_id, plan, spool, received_bytes))
+            except BaseException:
+                # Interrompido (ex. pelo callback): não espera os downloads que faltam
+                executor.shutdown(cancel_futures=True)
+                raise
         
         successful = sum(1 for r in results if r["success"])
         total_records = sum(r["records"] for r in results)
+        rows_avoided = sum(r.get("rows_avoided", 0) for r in results)
+        bytes_avoided = sum(r.get("bytes_avoided", 0) for r in results)
+        peak_kb = peak_memory_kb()
         
         return {
             "success": True,
-            "message": f"Processados {successful}/{total} jogos, {total_records} registros salvos",
+            "message": (
+                f"Processados {successful}/{total} jogos, {total_records} registros salvos "
+                f"(evitados ~{rows_avoided} pontos / {bytes_avoided / 1024:.0f} KB)"
+                + (f", pico de memória {peak_kb} KB" if peak_kb is not None else "")
+            ),
             "results": results,
-            "total_records": total_records
+            "total_records": total_records,
+            "rows_avoided": rows_avoided,
+            "bytes_avoided": bytes_avoided,
+            "peak_memory_kb": peak_kb
         }
\ No newline at end of file
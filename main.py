@@ -1,14 +1,24 @@
 import streamlit as st
-from steam import *
-from ui import *
+from dotenv import load_dotenv
 
-# Create tabs
-tabs = st.tabs(["SteamData", "WishList"])
+# Antes do import do ui, que lê as chaves do ambiente
+load_dotenv()
 
-with tabs[0]:
+from ui import plot_wishlist_altair, show_alert_banner, show_debug_panel, showSteamWishList
+
+show_alert_banner()
+
+# Seletor de aba em vez de st.tabs: as abas do st.tabs executam todas a
+# cada rerun, enquanto aqui só a aba escolhida roda (pandas e altair só
+# carregam quando a WishList é aberta)
+tab = st.radio("Aba", ["SteamData", "WishList"], key="main_tab", horizontal=True, label_visibility="collapsed")
+
+if tab == "SteamData":
     st.title("SteamData")
     showSteamWishList()
-
-with tabs[1]:
+else:
     st.title("WishList")
     plot_wishlist_altair()
+
+# Por último, para incluir as medições deste rerun
+show_debug_panel()
@@ -0,0 +1,232 @@
+"""
+Instrumentação leve dos caminhos quentes: número de chamadas e histograma de
+tempos de consultas SQLite, transformações pandas, requisições HTTP, esperas
+de rate limit e renderização do gráfico.
+
+Desligada por padrão: cada ponto instrumentado custa só o teste da flag.
+Liga com WISHLIST_METRICS=1, metrics.enable() ou o painel de debug da interface.
+
+    @metrics.timed("db.get_prices_for_game")
+    def get_prices_for_game(...): ...
+
+    with metrics.timer("ui.altair_chart"):
+        st.altair_chart(chart)
+
+Exporta em JSON (to_json) ou no formato texto do Prometheus (to_prometheus).
+"""
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+# Limites (s) dos buckets dos histogramas, no estilo dos padrões do Prometheus
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROMETHEUS_PREFIX = "wishlist"
+
+_enabled = os.getenv("WISHLIST_METRICS", "").lower() in ("1", "true", "yes")
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_NULL_TIMER = nullcontext()
+
+
+class Histogram:
+    """Contagem, soma, máximo e buckets (limite superior inclusivo) de durações em segundos"""
+
+    __slots__ = ("buckets", "count", "sum", "max")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # o último é o +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Estimativa do quantil q: limite do bucket onde ele cai (nunca acima do máximo)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Descarta tudo o que foi medido até aqui"""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())) if labels else ())
+
+
+def observe(name, seconds, **labels):
+    """Registra uma duração (s) no histograma name/labels"""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+
+def count(name, value=1, **labels):
+    """Incrementa o contador name/labels"""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def timer(name, **labels):
+    """Context manager que registra a duração do bloco (nada faz se desligado)"""
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(name, labels)
+
+
+def timed(name):
+    """Decorator que registra a duração de cada chamada (não usar em geradores)"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def snapshot():
+    """
+    Retrato das métricas: {"enabled", "timings": [...], "counters": [...]},
+    com tempos em ms e percentis estimados pelos buckets.
+    """
+    with _lock:
+        timings = [
+            {
+                "name": name,
+                "labels": dict(labels),
+                "count": histogram.count,
+                "total_ms": _ms(histogram.sum),
+                "mean_ms": _ms(histogram.sum / histogram.count),
+                "p50_ms": _ms(histogram.quantile(0.5)),
+                "p90_ms": _ms(histogram.quantile(0.9)),
+                "p99_ms": _ms(histogram.quantile(0.99)),
+                "max_ms": _ms(histogram.max),
+            }
+            for (name, labels), histogram in sorted(_histograms.items())
+        ]
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(_counters.items())
+        ]
+    return {"enabled": _enabled, "timings": timings, "counters": counters}
+
+
+def to_json():
+    return json.dumps(snapshot(), indent=2, ensure_ascii=False)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prometheus_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in pairs) + "}"
+
+
+def to_prometheus():
+    """Métricas no formato texto de exposição do Prometheus"""
+    with _lock:
+        histograms = [(key, list(h.buckets), h.sum, h.count) for key, h in sorted(_histograms.items())]
+        counters = sorted(_counters.items())
+
+    lines = []
+    if histograms:
+        metric = f"{PROMETHEUS_PREFIX}_duration_seconds"
+        lines += [f"# HELP {metric} Duração das operações instrumentadas", f"# TYPE {metric} histogram"]
+        for (name, labels), buckets, total, samples in histograms:
+            labels = (("name", name),) + labels
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + ("+Inf",), buckets):
+                cumulative += bucket
+                lines.append(f"{metric}_bucket{_prometheus_labels(labels, le=bound)} {cumulative}")
+            lines.append(f"{metric}_sum{_prometheus_labels(labels)} {total!r}")
+            lines.append(f"{metric}_count{_prometheus_labels(labels)} {samples}")
+
+    if counters:
+        metric = f"{PROMETHEUS_PREFIX}_events_total"
+        lines += [f"# HELP {metric} Eventos contados (respostas HTTP, cache, erros)", f"# TYPE {metric} counter"]
+        for (name, labels), value in counters:
+            lines.append(f"{metric}{_prometheus_labels((('name', name),) + labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write(path):
+    """Grava as métricas em path: formato Prometheus para .prom/.txt, JSON nos demais"""
+    path = Path(path)
+    text = to_prometheus() if path.suffix in (".prom", ".txt") else to_json()
+    path.write_text(text, encoding="utf-8")
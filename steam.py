@@ -1,66 +1,195 @@
-import requests 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http_client import TokenBucket, get_http_client
+import metrics
 
 class steamclient:
     """Cliente para interagir com a Steam API"""
-    
+
     BASE_URL = "https://api.steampowered.com"
-    
-    def __init__(self, steamid, webapikey):
+    STORE_URL = "https://store.steampowered.com"
+    TIMEOUT = 10
+    MAX_WORKERS = 8
+    BATCH_SIZE = 100
+    # Validade do cache em disco: detalhes (nome) mudam pouco, preços mais
+    DETAILS_CACHE_TTL = 24 * 60 * 60
+    PRICES_CACHE_TTL = 15 * 60
+
+    def __init__(self, steamid, webapikey, base_url=None, store_url=None, http=None):
         self.steamid = steamid
         self.webapikey = webapikey
+        self.base_url = base_url or self.BASE_URL
+        self.store_url = store_url or self.STORE_URL
+        # Transporte compartilhado: keep-alive, retries e cache de respostas
+        self.http = http or get_http_client()
 
-    def getAppName(self, appid):
-        """Fetch app details including name and price"""
-        appdetail = requests.get(f"https://store.steampowered.com/api/appdetails?appids={appid}&cc=br").json()
-        
-        if appdetail[str(appid)]["success"]:
-            data = appdetail[str(appid)].get("data")
-            name = data.get("name", "Unknown App")
-            
+    @metrics.timed("steam.appdetails")
+    def _fetchAppDetails(self, appid, filters=None):
+        """appid pode ser um único id ou uma lista (só aceito pela Steam com filters)"""
+        if isinstance(appid, (list, tuple)):
+            appid = ",".join(map(str, appid))
+
+        params = {"appids": appid, "cc": "br"}
+        if filters:
+            params["filters"] = filters
+
+        response = self.http.get(
+            f"{self.store_url}/api/appdetails",
+            params=params,
+            timeout=self.TIMEOUT,
+            cache_ttl=self.PRICES_CACHE_TTL if filters == "price_overview" else self.DETAILS_CACHE_TTL,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _parseAppDetails(appid, entry):
+        """
+        Extrai nome e preço de uma entrada do appdetails.
+        Funciona tanto para a resposta completa quanto para filters=price_overview
+        (nesse caso "name" vem None). Jogos sem price_overview (gratuitos) têm preço 0.
+        """
+        if not entry or not entry.get("success"):
             return {
                 "appid": appid,
-                "name": name,
+                "name": "Unknown App",
+                "price": None,
+                "currency": None
             }
-    
-    def getAppDetails(self, appid):
+
+        # Com filters, jogos sem preço vêm com data = [] ao invés de {}
+        data = entry.get("data") or {}
+        name = data.get("name")
+
+        # Extract price from price_overview
+        price = 0
+        currency = 'BRL'
+
+        if "price_overview" in data:
+            price_overview = data["price_overview"]
+            price = price_overview.get("final", 0) / 100  # Price is in cents
+            currency = price_overview.get("currency", "BRL")
+
+        return {
+            "appid": appid,
+            "name": name,
+            "price": price,
+            "currency": currency
+        }
+
+    def getAppName(self, appid):
         """Fetch app details including name and price"""
-        appdetail = requests.get(f"https://store.steampowered.com/api/appdetails?appids={appid}&cc=br").json()
-        
+        appdetail = self._fetchAppDetails(appid)
+
         if appdetail[str(appid)]["success"]:
-            data = appdetail[str(appid)].get("data")
-            name = data.get("name", "Unknown App")
-            
-            # Extract price from price_overview
-            price = 0
-            currency = 'BRL'
-            
-            if "price_overview" in data:
-                price_overview = data["price_overview"]
-                price = price_overview.get("final", 0) / 100  # Price is in cents
-                currency = price_overview.get("currency", "BRL")
-            
+            details = self._parseAppDetails(appid, appdetail[str(appid)])
+
             return {
                 "appid": appid,
-                "name": name,
-                "price": price,
-                "currency": currency
+                "name": details["name"] or "Unknown App",
             }
-        
-        return {
-            "appid": appid,
-            "name": "Unknown App",
-            "price": None,
-            "currency": None
-        }
+
+    def getAppDetails(self, appid):
+        """Fetch app details including name and price"""
+        appdetail = self._fetchAppDetails(appid)
+        details = self._parseAppDetails(appid, appdetail.get(str(appid)))
+        if details["name"] is None:
+            details["name"] = "Unknown App"
+        return details
+
+    def getAppPricesBatched(self, appids, batch_size=None):
+        """
+        Busca preços de vários appids com uma requisição por lote
+        (appids=1,2,3&filters=price_overview, único formato multi-appid aceito pela Steam).
+
+        Gera {"appid", "price", "currency"} por jogo, lote a lote. Se um lote
+        falhar, os jogos daquele lote são buscados individualmente; se também
+        falhar, o resultado tem preço None e a chave "error".
+        """
+        appids = list(appids)
+        batch_size = batch_size or self.BATCH_SIZE
+
+        for start in range(0, len(appids), batch_size):
+            batch = appids[start:start + batch_size]
+
+            try:
+                response = self._fetchAppDetails(batch, filters="price_overview")
+                if not isinstance(response, dict):
+                    raise ValueError("resposta inesperada do appdetails")
+                entries = response
+            except Exception as e:
+                print(f"Erro no lote de preços ({len(batch)} jogos), buscando individualmente: {e}")
+                entries = None
+
+            for appid in batch:
+                if entries is not None:
+                    details = self._parseAppDetails(appid, entries.get(str(appid)))
+                else:
+                    # Também com filters=price_overview: sem filters a resposta
+                    # vem do cache de detalhes (DETAILS_CACHE_TTL), velha para preços
+                    try:
+                        response = self._fetchAppDetails(appid, filters="price_overview")
+                        details = self._parseAppDetails(appid, response.get(str(appid)))
+                    except Exception as e:
+                        print(f"Erro ao buscar preço do appid {appid}: {e}")
+                        yield {"appid": appid, "price": None, "currency": None, "error": str(e)}
+                        continue
+
+                yield {"appid": appid, "price": details["price"], "currency": details["currency"]}
+
+    def getAppDetailsConcurrent(self, appids, max_workers=None, requests_per_second=None):
+        """
+        Busca getAppDetails para vários appids em paralelo.
+
+        - max_workers: número máximo de requisições simultâneas
+        - requests_per_second: limite via token bucket (None = sem limite)
+
+        Gera os resultados conforme ficam prontos (ordem de conclusão, não a de
+        appids), para que a barra de progresso avance a cada jogo. Em caso de
+        erro, o resultado tem "name" None e a chave "error".
+        """
+        bucket = TokenBucket(requests_per_second, name="steam") if requests_per_second else None
+
+        def fetch(appid):
+            if bucket:
+                bucket.acquire()
+            return self.getAppDetails(appid)
+
+        with ThreadPoolExecutor(max_workers=max_workers or self.MAX_WORKERS) as executor:
+            futures = {executor.submit(fetch, appid): appid for appid in appids}
+
+            for future in as_completed(futures):
+                appid = futures[future]
+                try:
+                    yield future.result()
+                except Exception as e:
+                    print(f"Erro ao buscar detalhes do appid {appid}: {e}")
+                    yield {
+                        "appid": appid,
+                        "name": None,
+                        "price": None,
+                        "currency": None,
+                        "error": str(e)
+                    }
+
+    @metrics.timed("steam.wishlist")
+    def getSteamWishListItems(self):
+        """Itens da wishlist: dicts com appid, priority e date_added (segundos desde 1970, UTC)"""
+        wishlist = self.http.get(
+            f"{self.base_url}/IWishlistService/GetWishlist/v1/",
+            params={"key": self.webapikey, "steamid": self.steamid},
+            timeout=self.TIMEOUT,
+        ).json()["response"]["items"]
+
+        return [
+            {"appid": item["appid"], "priority": item.get("priority"), "date_added": item.get("date_added")}
+            for item in wishlist
+        ]
 
     def getSteamWishList(self):
-        wishlist = requests.get(f"{self.BASE_URL}/IWishlistService/GetWishlist/v1/?key={self.webapikey}&steamid={self.steamid}").json()["response"]["items"]
-        appids = [item["appid"] for item in wishlist]
-        
+        appids = [item["appid"] for item in self.getSteamWishListItems()]
+
         return appids #retorna lista de app ids
-    
+
     def getSteamAppPrice(self, appid):
-        app_info = self.getAppDetails(appid)
+        app_info = next(self.getAppPricesBatched([appid]))
         return {"price": app_info["price"], "currency": app_info["currency"]}
-
-    
\ No newline at end of file
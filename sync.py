@@ -0,0 +1,444 @@
+"""
+Worker de sincronização, independente do Streamlit.
+
+Executa os pipelines da Steam e da ITAD a partir da fila sync_jobs do
+wishlist.db e grava o progresso lá, para a interface apenas ler.
+
+    python -m sync                   # roda continuamente (fila + agendamento diário)
+    python -m sync --drain           # executa os jobs pendentes e sai
+    python -m sync --once            # enfileira wishlist, prices e history e executa
+    python -m sync --enqueue prices  # só enfileira
+    python -m sync --drain --metrics metrics.prom  # grava as métricas (metrics.py)
+    python -m sync --parquet         # atualiza o snapshot Parquet após cada job (columnar.py)
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+import alerts
+import columnar
+import metrics
+from data import WishlistDatabase
+from itad_integration import ITADClient
+from steam import steamclient
+
+JOB_KINDS = ("wishlist", "prices", "history")
+# Um heartbeat por worker: "worker_heartbeat:<host>:<pid>"
+HEARTBEAT_PREFIX = "worker_heartbeat:"
+LAST_SCHEDULED_KEY = "last_scheduled_run"
+# Sem heartbeat por este tempo, o worker (ou job) é considerado parado
+WORKER_STALE_AFTER = timedelta(minutes=2)
+# Cada heartbeat é um commit (e invalida o cache da interface): não gravar sempre
+HEARTBEAT_INTERVAL = 30
+# Falhas de um item (jogo) de um job são tentadas de novo após
+# ITEM_RETRY_DELAY segundos, dobrando a cada falha, até ITEM_MAX_ATTEMPTS vezes
+ITEM_MAX_ATTEMPTS = 4
+ITEM_RETRY_DELAY = 30
+
+_last_heartbeat = 0.0
+
+
+class JobProgress:
+    """Grava o progresso do job no banco, no máximo a cada min_interval segundos"""
+
+    def __init__(self, db, job_id, min_interval=1.0):
+        self.db = db
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self._last_write = 0.0
+
+    def __call__(self, current, total, message=None):
+        now = time.monotonic()
+        if current < total and now - self._last_write < self.min_interval:
+            return
+        self._last_write = now
+        self.db.update_sync_job(self.job_id, current, total, message)
+
+
+class JobItems:
+    """
+    Checkpoint por item de um job (sync_job_items): um job interrompido e
+    retomado processa só os itens pendentes ou com falha, e as falhas são
+    tentadas de novo com backoff exponencial no mesmo job.
+
+    Sem job (progress sem job_id, ex. nos benchmarks) nada é gravado e cada
+    item é processado uma única vez.
+    """
+
+    def __init__(self, db, progress, keys):
+        self.db = db
+        self.progress = progress
+        self.job_id = getattr(progress, "job_id", None)
+        self.keys = [str(key) for key in keys]
+        self.total = len(self.keys)
+        self.done = 0
+        self.failed = 0
+        if self.job_id is not None:
+            db.set_sync_job_items(self.job_id, self.keys)
+            self.done = db.get_sync_job_item_counts(self.job_id)["done"]
+
+    def rounds(self):
+        """
+        Gera as listas de itens a processar: a primeira passada e, depois, as
+        novas tentativas das falhas, esperando o backoff (com heartbeat)
+        """
+        if self.job_id is None:
+            yield self.keys
+            return
+
+        while True:
+            due = self.db.get_sync_job_items(self.job_id, ITEM_MAX_ATTEMPTS)
+            if due:
+                self.failed = 0
+                yield due
+                continue
+
+            retry_at = self.db.get_next_sync_job_retry(self.job_id, ITEM_MAX_ATTEMPTS)
+            if retry_at is None:
+                return
+            wait = (retry_at - datetime.now(timezone.utc)).total_seconds()
+            self.progress(self.done, self.total, f"Nova tentativa de {self.failed} item(ns) em {max(wait, 0):.0f}s")
+            time.sleep(min(max(wait, 0), HEARTBEAT_INTERVAL))
+
+    def checkpoint(self, keys, error=None, message=None):
+        """Marca os itens como concluídos (error None) ou com falha"""
+        keys = [str(key) for key in keys]
+        if error is None:
+            self.done += len(keys)
+        else:
+            self.failed += len(keys)
+        if self.job_id is not None:
+            self.db.checkpoint_sync_job_items(self.job_id, keys, error, retry_delay=ITEM_RETRY_DELAY)
+        self.progress(self.done, self.total, message)
+
+    def summary(self):
+        """Sufixo da mensagem final com as falhas que esgotaram as tentativas"""
+        return f", {self.total - self.done} com erro" if self.done < self.total else ""
+
+
+# A configuração (STEAMID, WEBAPIKEY, ITAD_*) é lida do ambiente na hora do
+# uso: o .env é carregado pelo ponto de entrada (main aqui, main.py na interface)
+def steam_from_env():
+    return steamclient(os.getenv("STEAMID"), os.getenv("WEBAPIKEY"))
+
+
+def itad_settings():
+    """Chave da ITAD, lojas (ids da ITAD, ex. "61,35") e países (ex. "BR,US") do histórico"""
+    return (
+        os.getenv("ITAD_API_KEY"),
+        [int(shop) for shop in os.getenv("ITAD_SHOPS", "61").split(",")],
+        os.getenv("ITAD_COUNTRIES", "BR").split(","),
+    )
+
+
+def sync_wishlist(db, progress, steam=None):
+    """
+    Sincroniza a wishlist da Steam por diferença: só os jogos novos têm os
+    detalhes buscados (nome e preço, na mesma resposta do appdetails) e os
+    que saíram da lista são marcados como removidos. Com a wishlist
+    inalterada, é uma única requisição
+    """
+    steam = steam or steam_from_env()
+    wishlist = steam.getSteamWishListItems()
+    new_appids = db.get_new_appids(item["appid"] for item in wishlist)
+    total = len(new_appids)
+    progress(0, total, "Buscando detalhes dos jogos novos")
+
+    appData = []
+    for i, details in enumerate(steam.getAppDetailsConcurrent(new_appids), start=1):
+        if details["name"] is not None:
+            appData.append(details)
+        progress(i, total)
+
+    saved = db.apply_wishlist_diff(wishlist, appData)
+    if appData:
+        db.save_wishlist_prices(
+            (app["appid"], app["price"], app["currency"], None) for app in appData
+        )
+    return (
+        f"WishList sincronizada ({len(wishlist)} jogos): {saved['added']} novos, "
+        f"{saved['removed']} removidos, {saved['restored']} readicionados"
+    )
+
+
+def sync_prices(db, progress, steam=None):
+    """
+    Atualiza o preço atual de todos os jogos (requisições em lote). Os preços
+    são gravados e marcados como concluídos a cada lote, então um job
+    retomado só busca os jogos que faltaram ou falharam
+    """
+    steam = steam or steam_from_env()
+    appids = [item[0] for item in db.get_latest_wishlist()["items"]]
+    items = JobItems(db, progress, appids)
+
+    changes = 0
+    for keys in items.rounds():
+        price_rows = []
+        for price_info in steam.getAppPricesBatched([int(key) for key in keys]):
+            if "error" in price_info:
+                items.checkpoint([price_info["appid"]], price_info["error"])
+                continue
+            price_rows.append((price_info["appid"], price_info["price"], price_info["currency"], None))
+            if len(price_rows) >= steam.BATCH_SIZE:
+                changes += db.save_wishlist_prices(price_rows)["inserted"]
+                items.checkpoint([row[0] for row in price_rows])
+                price_rows = []
+
+        if price_rows:
+            changes += db.save_wishlist_prices(price_rows)["inserted"]
+            items.checkpoint([row[0] for row in price_rows])
+
+    return f"Preços verificados para {items.done} jogos, {changes} mudanças salvas{items.summary()}"
+
+
+def sync_history(db, progress):
+    """
+    Sincroniza o histórico ITAD de todos os jogos (incremental), por país.
+    Cada jogo/país é um item do job (ex. "BR:1808500"): um job retomado não
+    baixa de novo o que já terminou, e falhas de rede são tentadas de novo
+    """
+    api_key, shops, countries = itad_settings()
+    if not api_key:
+        raise RuntimeError("Configure ITAD_API_KEY no arquivo .env")
+
+    names = {item[0]: item[1] for item in db.get_latest_wishlist()["items"]}
+    items = JobItems(db, progress, [f"{country}:{appid}" for country in countries for appid in names])
+
+    def checkpoint(country, result):
+        error = result["message"] if result.get("retryable") else None
+        items.checkpoint([f"{country}:{result['appid']}"], error, result["message"])
+
+    records = rows_avoided = bytes_avoided = 0
+    peak_kb = None
+    for keys in items.rounds():
+        for country in countries:
+            appids = [int(key.split(":")[1]) for key in keys if key.split(":")[0] == country]
+            if not appids:
+                continue
+            itad = ITADClient(api_key, db=db, shops=shops, country=country)
+            result = itad.fetch_all_wishlist_history(
+                [(appid, names[appid]) for appid in appids],
+                progress_callback=lambda i, _, r: checkpoint(country, r),
+                months=12
+            )
+            if not result["success"]:
+                raise RuntimeError(result["message"])
+            records += result["total_records"]
+            rows_avoided += result["rows_avoided"]
+            bytes_avoided += result["bytes_avoided"]
+            # O pico do tracemalloc já é do processo inteiro: vale o maior
+            if result["peak_memory_kb"] is not None:
+                peak_kb = max(peak_kb or 0, result["peak_memory_kb"])
+
+    return (
+        f"Processados {items.done}/{items.total} jogos, {records} registros salvos "
+        f"(evitados ~{rows_avoided} pontos / {bytes_avoided / 1024:.0f} KB)"
+        + (f", pico de memória {peak_kb} KB" if peak_kb is not None else "")
+        + items.summary()
+    )
+
+
+PIPELINES = {
+    "wishlist": sync_wishlist,
+    "prices": sync_prices,
+    "history": sync_history,
+}
+
+
+def run_job(db, job_id, kind):
+    progress = JobProgress(db, job_id)
+    try:
+        message = PIPELINES[kind](db, progress)
+        db.finish_sync_job(job_id, "done", message)
+    except Exception as e:
+        print(f"Erro no job {job_id} ({kind}): {e}")
+        db.finish_sync_job(job_id, "failed", str(e))
+
+
+def heartbeat(db, worker_id):
+    global _last_heartbeat
+    now = time.monotonic()
+    if now - _last_heartbeat < HEARTBEAT_INTERVAL:
+        return
+    _last_heartbeat = now
+    db.set_sync_meta(HEARTBEAT_PREFIX + worker_id, datetime.now(timezone.utc).isoformat(timespec='seconds'))
+
+
+def clear_heartbeat(db, worker_id):
+    """Remove o heartbeat do worker, para a interface não contar com ele depois que sair"""
+    global _last_heartbeat
+    _last_heartbeat = 0.0
+    db.delete_sync_meta(HEARTBEAT_PREFIX + worker_id)
+
+
+def process_alive(worker_id):
+    """
+    O processo do worker ("host:pid") ainda existe? Só dá para verificar na
+    mesma máquina e fora do Windows (lá os.kill encerraria o processo); nos
+    outros casos vale só o heartbeat.
+    """
+    host, _, pid = worker_id.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit() or os.name == "nt":
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def refresh_snapshot(db):
+    """Reexporta o snapshot Parquet se os preços mudaram desde o último"""
+    if columnar.is_current(db):
+        return
+    try:
+        info = columnar.export_snapshot(db)
+        print(f"Snapshot Parquet atualizado: {info['rows']} preços")
+    except Exception as e:
+        print(f"Erro ao exportar o snapshot Parquet: {e}")
+
+
+def drain(db, worker_id, metrics_path=None, parquet=False):
+    """
+    Executa jobs pendentes até a fila esvaziar. Retorna quantos foram executados.
+    Com metrics_path, regrava as métricas acumuladas após cada job. O snapshot
+    Parquet é mantido atualizado se já existir (ou se parquet=True).
+    """
+    recover_stale_jobs(db)
+    executed = 0
+    while True:
+        heartbeat(db, worker_id)
+        job = db.claim_sync_job(worker_id)
+        if job is None:
+            return executed
+        job_id, kind = job
+        print(f"Executando job {job_id} ({kind})")
+        run_job(db, job_id, kind)
+        executed += 1
+        if metrics_path:
+            metrics.write(metrics_path)
+        if parquet or columnar.snapshot_info() is not None:
+            refresh_snapshot(db)
+        delivered = alerts.deliver_pending(db)
+        if delivered:
+            print(f"{delivered} alerta(s) de preço entregue(s)")
+
+
+def recover_stale_jobs(db):
+    """
+    Devolve à fila os jobs running de workers que pararam: sem heartbeat há
+    WORKER_STALE_AFTER ou cujo processo já não existe (mesmo com heartbeat recente)
+    """
+    running = db.get_sync_jobs(limit=1000, status="running")
+    dead = {job["worker"] for job in running if job["worker"] and not process_alive(job["worker"])}
+    stale = db.recover_stale_sync_jobs(WORKER_STALE_AFTER, dead_workers=dead)
+    if stale["requeued"]:
+        print(f"{stale['requeued']} job(s) interrompido(s) de volta à fila")
+    if stale["failed"]:
+        print(f"{stale['failed']} job(s) interrompido(s) marcado(s) como failed")
+    return stale
+
+
+def enqueue_scheduled(db, interval):
+    """Enfileira a sincronização completa se a última foi há mais de interval"""
+    last_run = db.get_sync_meta(LAST_SCHEDULED_KEY)
+    now = datetime.now(timezone.utc)
+    if last_run and now - datetime.fromisoformat(last_run) < interval:
+        return False
+
+    for kind in JOB_KINDS:
+        db.create_sync_job(kind)
+    db.set_sync_meta(LAST_SCHEDULED_KEY, now.isoformat(timespec='seconds'))
+    return True
+
+
+def worker_is_alive(db):
+    """
+    Há um worker ativo (heartbeat recente de um worker ou de um job em
+    execução, cujo processo ainda existe)? Workers --drain apagam o heartbeat
+    ao sair.
+    """
+    cutoff = datetime.now(timezone.utc) - WORKER_STALE_AFTER
+    beats = [(key[len(HEARTBEAT_PREFIX):], beat) for key, beat in db.get_sync_meta_prefix(HEARTBEAT_PREFIX).items()]
+    beats += [(job["worker"], job["heartbeat_at"]) for job in db.get_sync_jobs(limit=1000, status="running")]
+    return any(
+        beat and datetime.fromisoformat(beat) > cutoff and process_alive(worker or "")
+        for worker, beat in beats
+    )
+
+
+def start_background_worker():
+    """Inicia `python -m sync --drain` em um processo separado (sobrevive ao fechar a aba)"""
+    return subprocess.Popen(
+        [sys.executable, "-m", "sync", "--drain"],
+        cwd=Path(__file__).parent,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker de sincronização da wishlist")
+    parser.add_argument("--drain", action="store_true", help="executa os jobs pendentes e sai")
+    parser.add_argument("--once", action="store_true", help="enfileira todos os pipelines, executa e sai")
+    parser.add_argument("--enqueue", choices=JOB_KINDS, action="append", help="enfileira um job e sai")
+    parser.add_argument("--interval", type=float, default=24, help="horas entre sincronizações agendadas")
+    parser.add_argument("--poll", type=float, default=5, help="segundos entre verificações da fila")
+    parser.add_argument("--trace-memory", action="store_true", help="mede o pico de memória (tracemalloc)")
+    parser.add_argument("--metrics", metavar="ARQUIVO",
+                        help="liga as métricas e as grava após cada job (.prom: Prometheus; senão JSON)")
+    parser.add_argument("--parquet", action="store_true",
+                        help="atualiza o snapshot Parquet (columnar.py) após cada job")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.trace_memory:
+        tracemalloc.start()
+    if args.metrics:
+        metrics.enable()
+
+    db = WishlistDatabase()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    if args.enqueue:
+        for kind in args.enqueue:
+            print(f"Job {db.create_sync_job(kind)} ({kind}) enfileirado")
+        return
+
+    if args.once:
+        for kind in JOB_KINDS:
+            db.create_sync_job(kind)
+
+    if args.drain or args.once:
+        while True:
+            drain(db, worker_id, args.metrics, args.parquet)
+            clear_heartbeat(db, worker_id)
+            # Um job enfileirado entre a fila vazia e o fim do heartbeat viu
+            # este worker como ativo: executá-lo antes de sair
+            if not db.get_sync_jobs(limit=1, status="pending"):
+                return
+
+    interval = timedelta(hours=args.interval)
+    print(f"Worker {worker_id} iniciado (agendamento a cada {args.interval:g}h)")
+    try:
+        while True:
+            enqueue_scheduled(db, interval)
+            drain(db, worker_id, args.metrics, args.parquet)
+            time.sleep(args.poll)
+    finally:
+        clear_heartbeat(db, worker_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,186 @@
-import streamlit as st
-import requests 
 import os
-from dotenv import load_dotenv
-import pandas as pd
-import altair as alt
-from data import *
-from itad_integration import *
-from steam import steamclient
-import utils
-
-load_dotenv()
-STEAMID=os.getenv("STEAMID")
-WEBAPIKEY=os.getenv("WEBAPIKEY")
-ITAD_API_KEY=os.getenv("ITAD_API_KEY")
+from pathlib import Path
+
+import streamlit as st
+
+import alerts
+import metrics
+from data import WishlistDatabase
+from itad_integration import ITADClient
+
+# pandas, altair, columnar (pyarrow), utils e sync são importados dentro das
+# funções que os usam: a aba SteamData abre sem carregá-los
+
+# O .env é carregado pelo main.py antes deste import
+ITAD_API_KEY = os.getenv("ITAD_API_KEY")
+# snapshot.json do columnar.PARQUET_DIR: conferido antes de importar o
+# columnar, que carrega o pyarrow
+PARQUET_SNAPSHOT = Path(__file__).parent / "parquet" / "snapshot.json"
+
+# Máximo de pontos enviados ao gráfico (ver utils.downsample_for_chart)
+MAX_CHART_POINTS = 500
+
+# Instâncias compartilhadas entre reruns e sessões, criadas no primeiro uso
+@st.cache_resource
+def get_database():
+    return WishlistDatabase()
+
+@st.cache_resource
+def get_itad_client():
+    return ITADClient(ITAD_API_KEY, db=get_database())
+
+# Consultas cacheadas pelo Streamlit entre reruns. A chave é a geração do
+# banco (WishlistDatabase.get_generation): qualquer gravação gera uma nova
+# chave, então o cache só é reaproveitado enquanto os dados não mudam.
+# O timed fica por fora do cache: mede também os acertos.
+@metrics.timed("ui.load_latest_wishlist")
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_latest_wishlist(generation):
+    return get_database().get_latest_wishlist()
+
+@metrics.timed("ui.load_wishlist_game_names")
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_wishlist_game_names(generation):
+    return get_database().get_wishlist_game_names()
+
+@metrics.timed("ui.load_game_prices_df")
+@st.cache_data(show_spinner=False, max_entries=16)
+def load_game_prices_df(generation, appid, months, from_snapshot=False):
+    """
+    Histórico de um jogo já recortado no período, com a data convertida (fetch_date_dt).
+    from_snapshot: lê o snapshot Parquet (columnar.py), que traz o histórico
+    inteiro; o recorte fica com utils.filter_by_period
+    """
+    import pandas as pd
+
+    if from_snapshot:
+        import columnar
+
+        return columnar.load_game_prices_df(appid)
+
+    game_prices = get_database().get_prices_for_game(appid, months=months)
+    if game_prices is None:
+        return None
+
+    with metrics.timer("pandas.game_prices_df"):
+        game_df = pd.DataFrame(game_prices['items'], columns=['price', 'currency', 'ts'])
+        game_df['fetch_date_dt'] = pd.to_datetime(game_df.pop('ts'), unit='s', utc=True)
+    return game_df
+
+@metrics.timed("ui.load_price_summary_df")
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_price_summary_df(generation):
+    import pandas as pd
+
+    summary = get_database().get_wishlist_price_summary(low_window_days=90)
+    if summary is None:
+        return None
+
+    summary_df = pd.DataFrame(summary['items'], columns=[
+        'appid', 'name', 'current_price', 'currency', 'all_time_low', 'low_90d', 'pct_off', 'last_change'
+    ])
+    summary_df['last_change'] = pd.to_datetime(summary_df['last_change'], utc=True, format='ISO8601')
+    return summary_df
+
+SYNC_JOB_LABELS = {
+    "wishlist": "Buscar WishList",
+    "prices": "Preços atuais",
+    "history": "Histórico ITAD",
+}
+
+def enqueue_sync_job(data_instance, kind):
+    """Enfileira o job e garante que há um worker para executá-lo"""
+    import sync
+
+    job_id = data_instance.create_sync_job(kind)
+    if not sync.worker_is_alive(data_instance):
+        sync.start_background_worker()
+    st.toast(f"⏳ {SYNC_JOB_LABELS[kind]} enfileirado (job {job_id})")
+
+@st.fragment(run_every=3)
+def show_sync_jobs():
+    """Progresso dos jobs lido do banco; recarrega a página quando um job termina"""
+    jobs = get_database().get_sync_jobs(limit=5)
+    active = {job["id"] for job in jobs if job["status"] in ("pending", "running")}
+
+    for job in jobs:
+        label = SYNC_JOB_LABELS.get(job["kind"], job["kind"])
+        if job["status"] == "running":
+            fraction = job["progress"] / job["total"] if job["total"] else 0
+            st.progress(fraction, text=f"🔄 {label} — {job['progress']}/{job['total']} {job['message'] or ''}")
+        elif job["status"] == "pending":
+            st.caption(f"⏳ {label} — aguardando o worker")
+        else:
+            icon = "✅" if job["status"] == "done" else "❌"
+            st.caption(f"{icon} {label} ({job['finished_at']}): {job['message']}")
+
+    # Um job acompanhado terminou: rerun completo para ler os dados novos
+    finished = st.session_state.get("active_sync_jobs", set()) - active
+    st.session_state["active_sync_jobs"] = active
+    if finished:
+        st.rerun(scope="app")
+
+def show_alert_banner():
+    """Alertas de preço disparados e ainda não dispensados (ver alerts.py)"""
+    data_instance = get_database()
+    events = data_instance.get_alert_events(unseen=True, limit=20)
+    if not events:
+        return
+
+    with st.container(border=True):
+        st.markdown(f"**🔔 {len(events)} alerta(s) de preço**")
+        for event in events:
+            st.caption(alerts.format_alert(event))
+        if st.button("Dispensar alertas", key="dismiss_alerts"):
+            data_instance.mark_alert_events([event["id"] for event in events], seen=True)
+            st.rerun()
+
+def show_alert_rules(data_instance, game_options):
+    """Cadastro das regras de alerta (avaliadas a cada gravação de preços)"""
+    with st.expander("🔔 Alertas de preço"):
+        with st.form("new_alert_rule", clear_on_submit=True):
+            kind = st.selectbox("Regra", options=list(alerts.ALERT_LABELS), format_func=alerts.ALERT_LABELS.get)
+            game = st.selectbox("Jogo", options=["Todos os jogos", *game_options])
+            threshold = st.number_input(
+                "Preço-alvo (R$) ou % abaixo da mediana", min_value=0.0, value=None, step=1.0,
+                help="Não usado pela regra de menor preço histórico"
+            )
+            if st.form_submit_button("Adicionar regra"):
+                appid = None if game == "Todos os jogos" else game_options[game][0]
+                try:
+                    data_instance.add_alert_rule(kind, None if kind == "all_time_low" else threshold, appid=appid)
+                except ValueError as e:
+                    st.error(f"Regra inválida: {e}")
+
+        for rule in data_instance.get_alert_rules():
+            col_rule, col_delete = st.columns([5, 1])
+            col_rule.write(alerts.describe_rule(rule))
+            if col_delete.button("🗑️", key=f"delete_alert_rule_{rule['id']}"):
+                data_instance.delete_alert_rule(rule["id"])
+                st.rerun()
 
 def showSteamWishList():
     st.write("Esta é a seção SteamData onde você pode gerenciar sua lista de espera do Steam.")     
 
-    steamclient_instance = steamclient(STEAMID, WEBAPIKEY)
-    data_instance = WishlistDatabase()
-    itad_client_instance = ITADClient(ITAD_API_KEY)
+    data_instance = get_database()
 
-    latest_wishlist = data_instance.get_latest_wishlist()
+    latest_wishlist = load_latest_wishlist(data_instance.get_generation())
 
-    # Área de botões principais
+    # Área de botões principais: apenas enfileiram jobs para o worker (sync.py)
     col1, col2, col3 = st.columns(3)
     
     with col1:
         if st.button("🔄 Buscar WishList", key="fetch_wishlist"):
-
-            with st.spinner("Buscando itens da wishlist..."):
-                wishlist_ids = steamclient_instance.getSteamWishList()
-
-            total = len(wishlist_ids)
-            progress = st.progress(0)
-
-            # Como já vem nome e preço, só iteramos p/ mostrar progresso
-            appData = []
-            for i, id in enumerate(wishlist_ids, start=1):
-                appData.append(steamclient_instance.getAppDetails(id))
-                progress.progress(int(i * 100 / total))
-
-            # Save to database
-            data_instance.save_wishlist_multiple_games(appData)
-            st.success(f"✅ WishList atualizada com {len(appData)} jogos!")
-            st.rerun()
+            enqueue_sync_job(data_instance, "wishlist")
     with col2:
         if st.button("load prices", key="load_prices"):
-            with st.spinner("Carregando preços atuais..."):
-                wishlist = data_instance.get_latest_wishlist()
-                total = len(wishlist['items'])
-                progress = st.progress(0)
-
-                for i, item in enumerate(wishlist['items'], start=1):
-                    appid = item[0]
-                    price_info = steamclient_instance.getSteamAppPrice(appid)
-                    data_instance.save_wishlist_game_price(price_info, appid)
-                    progress.progress(int(i * 100 / total))
-                
-                st.success(f"✅ Preços atualizados para {total} jogos!")
-                st.rerun()
+            enqueue_sync_job(data_instance, "prices")
     with col3:
         # Botão para buscar histórico de TODOS os jogos
         if st.button("📊 Buscar Histórico Completo (ITAD)", key="fetch_all_history", disabled=not ITAD_API_KEY or not latest_wishlist):
-            st.info("🔍 Buscando histórico de preços para todos os jogos...")
-
-            progress_callback = utils.create_progress_callback()
-            # Buscar histórico
-            result = itad_client_instance.fetch_all_wishlist_history(
-                latest_wishlist['items'], 
-                progress_callback=progress_callback,
-                months=12
-            )
-            
-            if result['success']:
-                st.success(f"✅ {result['message']}")
-                st.rerun()
-            else:
-                st.error(f"❌ {result['message']}")
+            enqueue_sync_job(data_instance, "history")
+
+    show_sync_jobs()
 
     # Separador
     st.divider()
@@ -103,74 +206,123 @@ def showSteamWishList():
             appid, game_name = game_options[selected_game]
             
             with st.spinner(f"Buscando histórico de '{game_name}'..."):
-                result = itad_client_instance.fetch_price_history_for_game(appid, game_name, months=12)
+                result = get_itad_client().fetch_price_history_for_game(appid, game_name, months=12)
                 
                 if result['success']:
                     st.success(result['message'])                 
                 else:
                     st.error(result['message'])
 
+    show_alert_rules(data_instance, game_options)
+
+def show_wishlist_overview(data_instance):
+    """Visão geral: resumo de preços de todos os jogos (uma consulta agregada)"""
+    summary_df = load_price_summary_df(data_instance.get_generation())
+
+    if summary_df is None or summary_df.empty:
+        st.info("📉 Nenhum histórico de preços disponível para os jogos da wishlist.")
+        return
+
+    st.subheader('📋 Visão Geral da WishList')
+    st.dataframe(
+        summary_df.drop(columns=['appid', 'currency']),
+        hide_index=True,
+        column_config={
+            "name": st.column_config.TextColumn("Jogo"),
+            "current_price": st.column_config.NumberColumn("Preço atual", format="R$ %.2f"),
+            "all_time_low": st.column_config.NumberColumn("Menor preço", format="R$ %.2f"),
+            "low_90d": st.column_config.NumberColumn("Menor (90 dias)", format="R$ %.2f"),
+            "pct_off": st.column_config.NumberColumn("% abaixo do maior", format="%.1f%%"),
+            "last_change": st.column_config.DatetimeColumn("Última mudança", format="DD/MM/YYYY"),
+        },
+    )
+
+def snapshot_is_current(data_instance):
+    """Há snapshot Parquet por jogo em dia com o banco? Sem snapshot, nem importa o columnar"""
+    if not PARQUET_SNAPSHOT.exists():
+        return False
+    import columnar
+
+    return columnar.is_current(data_instance, by="game")
+
+@metrics.timed("ui.plot_wishlist_altair")
 def plot_wishlist_altair():
     """Module-level: build and render Altair chart for wishlist price history"""
+    import utils
 
-    data_instance = WishlistDatabase()
+    data_instance = get_database()
+
+    view = st.radio(
+        "Visualização:",
+        options=["Por jogo", "Visão geral"],
+        horizontal=True,
+        key="wishlist_view"
+    )
+    if view == "Visão geral":
+        show_wishlist_overview(data_instance)
+        return
 
-    games_with_prices = data_instance.get_latest_wishlist_with_prices()
-    games_with_prices_df = pd.DataFrame(games_with_prices['items'], columns=['appid', 'name', 'price', 'currency', 'fetch_date'])
-    st.dataframe(games_with_prices_df)
+    game_names = load_wishlist_game_names(data_instance.get_generation())
 
-    if games_with_prices is None or games_with_prices_df.empty:
+    if game_names is None or not game_names['items']:
         st.info("📉 Nenhum histórico de preços disponível para os jogos da wishlist.")
         return
-    
-    games_with_prices_df['fetch_date_dt'] = pd.to_datetime(games_with_prices_df['fetch_date'], utc=True)
 
-    # Get unique game names sorted
-    game_names = sorted(games_with_prices_df['name'].unique())
-    
-    if not game_names:
-        st.info("📉 Nenhum preço disponível para plotagem na wishlist.")
-        return
+    # Nome -> appid (apenas jogos com preço salvo)
+    game_options = {name: appid for appid, name in game_names['items']}
     
     # Add selectbox for user to choose a game
     st.subheader('📈 Histórico de Preços (WishList)')
-    selected_game = st.selectbox("Selecione um jogo para visualizar:", game_names, key="wishlist_game_select")
-    
-    # Filter data for selected game
-    game_data = games_with_prices_df[games_with_prices_df['name'] == selected_game].copy()
-    game_data = game_data.dropna(subset=['price', 'fetch_date_dt'])
+    selected_game = st.selectbox("Selecione um jogo para visualizar:", list(game_options), key="wishlist_game_select")
 
     period = st.radio(
         "Mostrar dados de:",
-        options=[
-            "Últimos 3 meses",
-            "Últimos 6 meses",
-            "Último ano",
-            "Max"
-        ],
+        options=list(utils.PERIOD_MONTHS),
         index=2,          # Último ano como padrão
         horizontal=True,
         key="wishlist_period"
     )
 
+    # Busca só o jogo selecionado, já recortado no período. Se houver um
+    # snapshot Parquet por jogo com os mesmos preços do banco, lê dele
+    # (no layout por mês, ler um jogo é mais lento que o SQLite)
+    game_data = load_game_prices_df(
+        data_instance.get_generation(),
+        game_options[selected_game],
+        utils.PERIOD_MONTHS[period],
+        from_snapshot=snapshot_is_current(data_instance)
+    )
+    game_data = game_data.dropna(subset=['price', 'fetch_date_dt'])
+    st.dataframe(game_data)
+
     game_data = utils.filter_by_period(
         game_data,
         period,
-        date_column='fetch_date_dt'
+        date_column='fetch_date_dt',
+        end_date=data_instance.get_last_price_check(game_options[selected_game])
     )
     
     if game_data.empty or sum(game_data['price']) == 0:
         st.warning(f"⚠️ Nenhum preço disponível para {selected_game}.")
         return
     
-    game_data['fetch_date_dt'] = pd.to_datetime(game_data['fetch_date_dt'], errors='coerce')
+    # Só as colunas e pontos necessários vão para o spec do Vega
+    chart_data = utils.downsample_for_chart(
+        game_data[['fetch_date_dt', 'price']],
+        date_column='fetch_date_dt',
+        price_column='price',
+        max_points=MAX_CHART_POINTS
+    )
+    import altair as alt
+
+    base = alt.Chart(chart_data)
 
     # Create a nearest selection for hover interaction (like Highcharts)
     nearest = alt.selection_point(nearest=True, on='mouseover', fields=['fetch_date_dt'], empty='none')
 
     # Build Altair chart with interactive hover
     line = (
-        alt.Chart(game_data)
+        base
         .mark_line(interpolate='step-after', point=True, color='#66CCFF')
         .encode(
             x=alt.X('fetch_date_dt:T', axis=alt.Axis(format='%d/%b/%Y', labelAngle=-90, title='Data')),
@@ -180,7 +332,7 @@ def plot_wishlist_altair():
 
     # Points that appear on hover
     points = (
-        alt.Chart(game_data)
+        base
         .mark_circle(color="#8766FF", size=100)
         .encode(
             x='fetch_date_dt:T',
@@ -198,4 +350,53 @@ def plot_wishlist_altair():
         .configure_title(color='white')
     )
 
-    st.altair_chart(chart, width='stretch')
\ No newline at end of file
+    with metrics.timer("ui.altair_chart"):
+        st.altair_chart(chart, width='stretch')
+
+
+def _format_labels(labels):
+    return ", ".join(f"{key}={value}" for key, value in labels.items())
+
+def _toggle_metrics():
+    if st.session_state["debug_metrics"]:
+        metrics.enable()
+    else:
+        metrics.disable()
+
+def show_debug_panel():
+    """
+    Barra lateral opcional com as métricas de desempenho (ver metrics.py).
+    Deve ser chamada no fim do script, para incluir o rerun atual.
+    """
+    with st.sidebar:
+        # on_change roda antes do rerun: o próprio rerun do clique já é medido
+        st.toggle("🐞 Métricas de desempenho", value=metrics.is_enabled(),
+                  key="debug_metrics", on_change=_toggle_metrics)
+        if not metrics.is_enabled():
+            return
+
+        import pandas as pd
+
+        snapshot = metrics.snapshot()
+        if snapshot['timings']:
+            timings = pd.DataFrame(snapshot['timings'])
+            timings['labels'] = timings['labels'].map(_format_labels)
+            st.dataframe(
+                timings.sort_values('total_ms', ascending=False),
+                hide_index=True,
+                column_order=['name', 'labels', 'count', 'total_ms', 'mean_ms', 'p50_ms', 'p99_ms', 'max_ms'],
+            )
+        else:
+            st.caption("Nada medido ainda.")
+
+        if snapshot['counters']:
+            counters = pd.DataFrame(snapshot['counters'])
+            counters['labels'] = counters['labels'].map(_format_labels)
+            st.dataframe(counters, hide_index=True)
+
+        col_json, col_prom, col_reset = st.columns(3)
+        col_json.download_button("JSON", metrics.to_json(), file_name="metrics.json", mime="application/json")
+        col_prom.download_button("Prometheus", metrics.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+        if col_reset.button("Zerar", key="reset_metrics"):
+            metrics.reset()
+            st.rerun()
\ No newline at end of file
@@ -1,34 +1,180 @@
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+import metrics
 
-def filter_by_period(df, period, date_column):
-    max_date = df[date_column].max()
 
-    if period == "Últimos 3 meses":
-        start_date = max_date - pd.DateOffset(months=3)
-    elif period == "Últimos 6 meses":
-        start_date = max_date - pd.DateOffset(months=6)
-    elif period == "Último ano":
-        start_date = max_date - pd.DateOffset(years=1)
-    else:
-        start_date = max_date - pd.DateOffset(months=18)
+# Períodos do seletor do gráfico -> meses ("Max" mostra 18 meses)
+PERIOD_MONTHS = {
+    "Últimos 3 meses": 3,
+    "Últimos 6 meses": 6,
+    "Último ano": 12,
+    "Max": 18,
+}
 
-    df_period = df[df[date_column] >= start_date]
 
-    df_ancora = (
-        df[df[date_column] < start_date]
-        .sort_values(date_column)
-        .tail(1)
-    )
+def _period_offset(period):
+    return pd.DateOffset(months=PERIOD_MONTHS.get(period, 18))
 
-    if not df_ancora.empty:
-        df_ancora = df_ancora.assign(**{date_column: start_date})
 
-    return (
-        pd.concat([df_ancora, df_period])
-        .sort_values(date_column)
-    )
+def _datetime64(dates):
+    """Datas como datetime64[ns] (UTC se tz-aware), sem passar por objetos"""
+    return dates.to_numpy(dtype="datetime64[ns]")
+
+
+@metrics.timed("pandas.filter_by_period")
+def filter_by_period(df, period, date_column, end_date=None):
+    """
+    Recorta o histórico no período escolhido, contado a partir da data mais
+    recente. O último ponto anterior à janela entra como âncora (com a data
+    movida para o início da janela), para a linha do gráfico começar no
+    preço vigente naquele momento.
+
+    end_date: última verificação do preço (get_last_price_check). Se for
+    posterior ao último ponto, a janela é contada a partir dela e o último
+    preço é repetido nessa data, já que só as mudanças são gravadas.
+
+    Espera df ordenado por date_column (como vem do banco); só ordena se
+    não estiver. O início da janela é achado com searchsorted e o resultado
+    é uma fatia do df original: só a janela é copiada, e só quando há âncora.
+    """
+    if df.empty:
+        return df
+
+    if not df[date_column].is_monotonic_increasing:
+        df = df.sort_values(date_column)
+
+    dates = df[date_column]
+    extend = end_date is not None and end_date > dates.iloc[-1]
+    start_date = (end_date if extend else dates.iloc[-1]) - _period_offset(period)
+
+    # Primeira linha dentro da janela; a anterior (se existir) é a âncora
+    first = dates.searchsorted(start_date, side='left')
+    if first == 0 and not extend:
+        return df
+
+    df_period = df.iloc[max(first - 1, 0):].copy()
+    if first > 0:
+        df_period.iloc[0, df_period.columns.get_loc(date_column)] = start_date
+    if extend:
+        last = df_period.iloc[[-1]].copy()
+        last.iloc[0, last.columns.get_loc(date_column)] = end_date
+        df_period = pd.concat([df_period, last])
+    return df_period
+
+
+@metrics.timed("pandas.filter_by_period_grouped")
+def filter_by_period_grouped(df, period, date_column, group_column):
+    """
+    Versão de filter_by_period para vários jogos de uma vez: cada grupo
+    (group_column) é recortado a partir da sua própria data mais recente,
+    com a mesma regra de âncora, em uma única passada vetorizada.
+
+    Espera df ordenado por (group_column, date_column); só ordena se não estiver.
+    """
+    if df.empty:
+        return df
+
+    groups = df[group_column].to_numpy()
+    dates = df[date_column]
+    values = _datetime64(dates)
+    same_group = groups[1:] == groups[:-1]
+    if not ((groups[1:] > groups[:-1]) | (same_group & (values[1:] >= values[:-1]))).all():
+        df = df.sort_values([group_column, date_column], kind='stable')
+        groups = df[group_column].to_numpy()
+        dates = df[date_column]
+        values = _datetime64(dates)
+
+    # Limites de cada grupo (dados ordenados): [bounds[k], bounds[k + 1])
+    bounds = np.concatenate(([0], np.flatnonzero(groups[1:] != groups[:-1]) + 1, [len(df)]))
+    lengths = np.diff(bounds)
+
+    # Início da janela de cada grupo, a partir da sua última data
+    last_dates = dates.iloc[bounds[1:] - 1].reset_index(drop=True)
+    start_dates = last_dates - _period_offset(period)
+    keep = values >= np.repeat(_datetime64(start_dates), lengths)
+
+    # Primeira linha na janela de cada grupo; a anterior no grupo é a âncora
+    first = bounds[:-1] + np.add.reduceat(~keep, bounds[:-1])
+    has_anchor = first > bounds[:-1]
+    anchors = first[has_anchor] - 1
+    keep[anchors] = True
+
+    df_period = df.iloc[np.flatnonzero(keep)].copy()
+    df_period.iloc[
+        np.searchsorted(np.flatnonzero(keep), anchors),
+        df_period.columns.get_loc(date_column)
+    ] = start_dates[has_anchor].to_numpy()
+    return df_period
+
+
+def keep_price_changes(df, price_column):
+    """
+    Mantém só os pontos onde o preço muda (mais o primeiro e o último).
+    Em um gráfico step-after, os pontos removidos não alteram a linha.
+    """
+    if len(df) <= 2:
+        return df
+
+    prices = df[price_column].to_numpy()
+    keep = np.ones(len(df), dtype=bool)
+    keep[1:] = prices[1:] != prices[:-1]
+    keep[-1] = True
+    return df.iloc[np.flatnonzero(keep)]
+
+
+def lttb_indices(x, y, max_points):
+    """
+    Largest-Triangle-Three-Buckets: escolhe max_points índices que preservam
+    a forma da série (sempre inclui o primeiro e o último ponto).
+    """
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    indices = np.empty(max_points, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+
+    # Buckets entre o primeiro e o último ponto
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # Média do próximo bucket (ou o último ponto)
+        if i < max_points - 3:
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        # Ponto do bucket que forma o maior triângulo com o anterior e a média
+        area = np.abs(
+            (x[selected] - avg_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (avg_y - y[selected])
+        )
+        selected = start + int(area.argmax())
+        indices[i + 1] = selected
+
+    return indices
+
+
+@metrics.timed("pandas.downsample_for_chart")
+def downsample_for_chart(df, date_column, price_column, max_points=500):
+    """
+    Reduz o histórico antes de montar o gráfico: primeiro descarta preços
+    repetidos; se ainda passar de max_points, aplica LTTB. Assim o JSON
+    enviado ao navegador tem tamanho limitado, qualquer que seja o histórico.
+    """
+    df = keep_price_changes(df, price_column)
+    if len(df) <= max_points:
+        return df
+
+    x = _datetime64(df[date_column]).astype(np.int64).astype(float)
+    y = df[price_column].to_numpy(dtype=float)
+    return df.iloc[lttb_indices(x, y, max_points)]
+
 
 def create_progress_callback():
     progress_container = st.empty()